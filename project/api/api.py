@@ -1,9 +1,13 @@
+from django.urls import path
 from rest_framework import routers
 
-from .views import FeedPointsViewSet, FeedViewSet
+from .views import EventViewSet, FeedPointsViewSet, FeedViewSet, event_tile
 
 router = routers.DefaultRouter()
 router.register(r"points", FeedPointsViewSet, basename="api-points")
 router.register(r"feeds", FeedViewSet, basename="api-feeds")
+router.register(r"events", EventViewSet, basename="api-events")
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path("tiles/<int:z>/<int:x>/<int:y>.mvt", event_tile, name="api-tiles"),
+]
@@ -1,4 +1,4 @@
-from dashboard.models import Feed
+from dashboard.models import Feed, FeedPointCluster, FeedStatus, WorkZoneEvent
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
@@ -9,10 +9,8 @@ class FeedPointsSerializer(
     status_type = serializers.SerializerMethodField()
 
     def get_status_type(self, obj):
-        feed_status = obj.feed_status()
-
-        if feed_status:
-            return feed_status.status_type
+        if obj.status_type != FeedStatus.StatusType.NULL:
+            return obj.status_type
 
         return ""
 
@@ -23,6 +21,40 @@ class Meta:
         auto_bbox = True
 
 
+class FeedPointClusterSerializer(GeoFeatureModelSerializer):
+    """
+    Clusters of feed points as GeoJSON features. Clusters of a single feed have the same properties as :class:`FeedPointsSerializer`'s features, as well as the cluster's.
+    """
+
+    point_count = serializers.IntegerField(source="feed_count")
+    status_type = serializers.SerializerMethodField()
+    issuingorganization = serializers.SerializerMethodField()
+    pk = serializers.SerializerMethodField()
+
+    def get_status_type(self, obj):
+        if obj.feed is not None and obj.feed.status_type != FeedStatus.StatusType.NULL:
+            return obj.feed.status_type
+
+        return ""
+
+    def get_issuingorganization(self, obj):
+        return obj.feed.issuingorganization if obj.feed is not None else ""
+
+    def get_pk(self, obj):
+        return obj.feed_id
+
+    class Meta:
+        model = FeedPointCluster
+        fields = (
+            "point_count",
+            "status_counts",
+            "status_type",
+            "issuingorganization",
+            "pk",
+        )
+        geo_field = "point"
+
+
 class FeedSerializer(serializers.ModelSerializer):
 
     feed_data = serializers.SerializerMethodField()
@@ -33,3 +65,35 @@ def get_feed_data(self, obj):
     class Meta:
         model = Feed
         fields = "__all__"
+
+
+class EventSerializer(GeoFeatureModelSerializer):
+    """
+    Events as GeoJSON features. The ``properties`` query parameter (comma separated) selects which properties are sent, all of them by default.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get("request")
+        properties = request.query_params.get("properties") if request else None
+        if properties:
+            selected = set(properties.split(",")) | {"geometry", "event_id"}
+            fields = {name: field for name, field in fields.items() if name in selected}
+
+        return fields
+
+    class Meta:
+        model = WorkZoneEvent
+        fields = (
+            "event_id",
+            "feed",
+            "event_type",
+            "road_names",
+            "direction",
+            "start_date",
+            "end_date",
+            "vehicle_impact",
+        )
+        geo_field = "geometry"
+        id_field = "event_id"
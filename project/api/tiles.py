@@ -0,0 +1,271 @@
+import math
+import struct
+from typing import Any, Iterable, Optional
+
+from django.contrib.gis.geos import GEOSGeometry, Polygon
+
+# Mapbox Vector Tile encoding (https://github.com/mapbox/vector-tile-spec/tree/master/2.1)
+
+EXTENT = 4096
+# Geometries are clipped a little outside the tile, so lines don't end at its edges
+BUFFER = 64
+# Half the width of the world in web mercator (EPSG:3857) meters
+WORLD_SIZE = 20037508.342789244
+
+POINT = 1
+LINESTRING = 2
+POLYGON = 3
+
+MOVE_TO = 1
+LINE_TO = 2
+CLOSE_PATH = 7
+
+
+def get_tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """A tile's bounds in web mercator meters (min x, min y, max x, max y)."""
+
+    size = 2 * WORLD_SIZE / 2**z
+    return (
+        -WORLD_SIZE + x * size,
+        WORLD_SIZE - (y + 1) * size,
+        -WORLD_SIZE + (x + 1) * size,
+        WORLD_SIZE - y * size,
+    )
+
+
+def get_tile_polygon(z: int, x: int, y: int, buffer: float = 0) -> Polygon:
+    min_x, min_y, max_x, max_y = get_tile_bounds(z, x, y)
+    margin = (max_x - min_x) * buffer / EXTENT
+    polygon = Polygon.from_bbox(
+        (min_x - margin, min_y - margin, max_x + margin, max_y + margin)
+    )
+    polygon.srid = 3857
+    return polygon
+
+
+def get_tile_bbox(z: int, x: int, y: int, buffer: float = 0) -> Polygon:
+    """A tile's bounds in longitude and latitude, as stored geometries are, to query with."""
+
+    min_x, min_y, max_x, max_y = get_tile_polygon(z, x, y, buffer).extent
+    polygon = Polygon.from_bbox(
+        (
+            min_x / WORLD_SIZE * 180,
+            get_latitude(min_y),
+            max_x / WORLD_SIZE * 180,
+            get_latitude(max_y),
+        )
+    )
+    polygon.srid = 4326
+    return polygon
+
+
+def get_latitude(y: float) -> float:
+    return math.degrees(math.atan(math.sinh(y / WORLD_SIZE * math.pi)))
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 24 and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+# PROTOBUF
+
+
+def encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def encode_key(field: int, wire_type: int) -> bytes:
+    return encode_varint((field << 3) | wire_type)
+
+
+def encode_bytes(field: int, value: bytes) -> bytes:
+    return encode_key(field, 2) + encode_varint(len(value)) + value
+
+
+def encode_uint(field: int, value: int) -> bytes:
+    return encode_key(field, 0) + encode_varint(value)
+
+
+def encode_packed(field: int, values: Iterable[int]) -> bytes:
+    return encode_bytes(field, b"".join(encode_varint(value) for value in values))
+
+
+def zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 31)
+
+
+def encode_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return encode_uint(7, int(value))
+    if isinstance(value, int) and value >= 0:
+        return encode_uint(5, value)
+    if isinstance(value, int):
+        return encode_uint(6, (value << 1) ^ (value >> 63))
+    if isinstance(value, float):
+        return encode_key(3, 1) + struct.pack("<d", value)
+    return encode_bytes(1, str(value).encode("utf-8"))
+
+
+# GEOMETRY
+
+
+class GeometryEncoder:
+    """Turns web mercator coordinates into a tile's integer coordinates, and those into geometry commands."""
+
+    def __init__(self, z: int, x: int, y: int):
+        self.min_x, _, _, self.max_y = get_tile_bounds(z, x, y)
+        self.scale = EXTENT / (2 * WORLD_SIZE / 2**z)
+        self.cursor = (0, 0)
+
+    def to_tile(self, coordinates) -> list[tuple[int, int]]:
+        points: list[tuple[int, int]] = []
+        for coordinate in coordinates:
+            point = (
+                round((coordinate[0] - self.min_x) * self.scale),
+                round((self.max_y - coordinate[1]) * self.scale),
+            )
+            # Points that round to the same pixel are only drawn once
+            if not points or points[-1] != point:
+                points.append(point)
+        return points
+
+    def command(self, command: int, points: list[tuple[int, int]]) -> list[int]:
+        commands = [(len(points) << 3) | command]
+        for point in points:
+            commands += [
+                zigzag(point[0] - self.cursor[0]),
+                zigzag(point[1] - self.cursor[1]),
+            ]
+            self.cursor = point
+        return commands
+
+    def encode(self, geometry: GEOSGeometry) -> Optional[tuple[int, list[int]]]:
+        """The feature type and geometry commands for a geometry, or None if it's empty at this zoom."""
+
+        self.cursor = (0, 0)
+        geom_type = geometry.geom_type
+
+        if geom_type in ("Point", "MultiPoint"):
+            points = [
+                point
+                for part in (geometry if geom_type == "MultiPoint" else [geometry])
+                for point in self.to_tile([part.coords])
+            ]
+            return (POINT, self.command(MOVE_TO, points)) if points else None
+
+        if geom_type in ("LineString", "MultiLineString"):
+            commands: list[int] = []
+            for line in geometry if geom_type == "MultiLineString" else [geometry]:
+                points = self.to_tile(line.coords)
+                if len(points) >= 2:
+                    commands += self.command(MOVE_TO, points[:1])
+                    commands += self.command(LINE_TO, points[1:])
+            return (LINESTRING, commands) if commands else None
+
+        if geom_type in ("Polygon", "MultiPolygon"):
+            commands = []
+            for polygon in geometry if geom_type == "MultiPolygon" else [geometry]:
+                for index, ring in enumerate(polygon):
+                    points = self.to_tile(ring.coords)[:-1]
+                    if len(points) < 3:
+                        if index == 0:
+                            break
+                        continue
+                    # Exterior rings are clockwise on screen, and interior rings counter-clockwise
+                    if (get_area(points) > 0) != (index == 0):
+                        points.reverse()
+                    commands += self.command(MOVE_TO, points[:1])
+                    commands += self.command(LINE_TO, points[1:])
+                    commands.append((1 << 3) | CLOSE_PATH)
+            return (POLYGON, commands) if commands else None
+
+        if geom_type == "GeometryCollection":
+            # Drawn as its first non-empty part, since a feature only has one type
+            for part in geometry:
+                encoded = self.encode(part)
+                if encoded is not None:
+                    return encoded
+
+        return None
+
+
+def get_area(points: list[tuple[int, int]]) -> float:
+    """Signed area of a ring in tile coordinates, positive if it's clockwise on screen."""
+    return (
+        sum(
+            x0 * y1 - x1 * y0
+            for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])
+        )
+        / 2
+    )
+
+
+# TILE
+
+
+class Layer:
+    def __init__(self, name: str, z: int, x: int, y: int):
+        self.name = name
+        self.encoder = GeometryEncoder(z, x, y)
+        self.clip = get_tile_polygon(z, x, y, BUFFER)
+        # Simplify to about a pixel of a 512 pixel tile
+        self.tolerance = (2 * WORLD_SIZE / 2**z) / 512
+        self.keys: dict[str, int] = {}
+        self.values: dict[Any, int] = {}
+        self.features: list[bytes] = []
+
+    def get_tags(self, properties: dict[str, Any]) -> list[int]:
+        tags: list[int] = []
+        for key, value in properties.items():
+            if value is None or value == "":
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            # Keyed by type as well, so eg. True and 1 stay separate values
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        return tags
+
+    def add_feature(
+        self, feature_id: int, geometry: GEOSGeometry, properties: dict[str, Any]
+    ):
+        """Adds a feature with a web mercator geometry, which is clipped to the tile and simplified for its zoom."""
+
+        if not geometry.intersects(self.clip):
+            return
+
+        if geometry.geom_type not in ("Point", "MultiPoint"):
+            geometry = geometry.simplify(self.tolerance)
+        if not self.clip.contains(geometry):
+            geometry = geometry.intersection(self.clip)
+        if geometry.empty:
+            return
+
+        encoded = self.encoder.encode(geometry)
+        if encoded is None:
+            return
+
+        geom_type, commands = encoded
+        self.features.append(
+            encode_uint(1, feature_id)
+            + encode_packed(2, self.get_tags(properties))
+            + encode_uint(3, geom_type)
+            + encode_packed(4, commands)
+        )
+
+    def encode(self) -> bytes:
+        if not self.features:
+            return b""
+
+        return encode_bytes(
+            3,
+            encode_uint(15, 2)
+            + encode_bytes(1, self.name.encode("utf-8"))
+            + b"".join(encode_bytes(2, feature) for feature in self.features)
+            + b"".join(encode_bytes(3, key.encode("utf-8")) for key in self.keys)
+            + b"".join(encode_bytes(4, encode_value(value)) for _, value in self.values)
+            + encode_uint(5, EXTENT),
+        )
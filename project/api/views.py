@@ -1,20 +1,177 @@
-from dashboard.models import Feed
+import json
+from typing import Optional
+
+from dashboard.models import MAX_CLUSTER_ZOOM, Feed, FeedPointCluster, WorkZoneEvent
+from django.contrib.gis.db.models.functions import Transform
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework_gis import filters
+from rest_framework_gis.pagination import GeoJsonPagination
+
+from .serializers import (
+    EventSerializer,
+    FeedPointClusterSerializer,
+    FeedPointsSerializer,
+    FeedSerializer,
+)
+from .tiles import BUFFER, Layer, get_tile_bbox, is_valid_tile
 
-from .serializers import FeedPointsSerializer, FeedSerializer
+# Tiles are keyed by their events, so they can be kept until they're evicted
+TILE_CACHE_TIMEOUT = 60 * 60 * 24
+# Browsers check back for tiles about as often as feeds are synced
+TILE_MAX_AGE = 60 * 15
 
 
 # Create your views here.
 class FeedPointsViewSet(
     viewsets.ReadOnlyModelViewSet,
 ):
-    bbox_filter_field = "geocoded_column"
+    """
+    Feeds' points. With ``zoom``, feeds are grouped into the clusters of :model:`dashboard.FeedPointCluster` for that zoom level, up to MAX_CLUSTER_ZOOM, past which every feed is its own point. Filter with ``in_bbox`` (min lon, min lat, max lon, max lat).
+    """
+
     filter_backends = [filters.InBBoxFilter]
-    queryset = Feed.objects.only("issuingorganization").all()
-    serializer_class = FeedPointsSerializer
+
+    def get_zoom(self) -> Optional[int]:
+        """The requested zoom level, or None if points shouldn't be clustered."""
+
+        zoom = self.request.query_params.get("zoom")
+        if zoom is None:
+            return None
+
+        try:
+            # Fractional zoom levels, as maps send, are rounded down
+            zoom = int(float(zoom))
+        except (ValueError, OverflowError):
+            raise ValidationError({"zoom": "Zoom must be a number."})
+
+        return max(zoom, 0) if zoom <= MAX_CLUSTER_ZOOM else None
+
+    @property
+    def bbox_filter_field(self):
+        return "point" if self.get_zoom() is not None else "geocoded_column"
+
+    def get_queryset(self):
+        zoom = self.get_zoom()
+        if zoom is not None:
+            return FeedPointCluster.objects.filter(zoom=zoom).select_related("feed")
+
+        return Feed.objects.only(
+            "issuingorganization", "status_type", "geocoded_column"
+        ).all()
+
+    def get_serializer_class(self):
+        if self.get_zoom() is not None:
+            return FeedPointClusterSerializer
+
+        return FeedPointsSerializer
 
 
 class FeedViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Feed.objects.all()
     serializer_class = FeedSerializer
+
+
+class EventPagination(GeoJsonPagination):
+    page_size = 1000
+    page_size_query_param = "limit"
+    max_page_size = 10000
+
+
+class EventViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Events across all feeds, from :model:`dashboard.WorkZoneEvent`. Filter with ``in_bbox`` (min lon, min lat, max lon, max lat), ``feeds`` and ``event_type`` (both comma separated), limit with ``limit`` and choose properties with ``properties``.
+    """
+
+    bbox_filter_field = "geometry"
+    bbox_filter_include_overlapping = True
+    filter_backends = [filters.InBBoxFilter]
+    pagination_class = EventPagination
+    serializer_class = EventSerializer
+
+    def get_queryset(self):
+        queryset = WorkZoneEvent.objects.filter(geometry__isnull=False).order_by("pk")
+
+        feeds = self.request.query_params.get("feeds")
+        if feeds:
+            queryset = queryset.filter(feed__in=feeds.split(","))
+
+        event_types = self.request.query_params.get("event_type")
+        if event_types:
+            queryset = queryset.filter(event_type__in=event_types.split(","))
+
+        return queryset
+
+
+def get_tile_events(z: int, x: int, y: int):
+    return WorkZoneEvent.objects.filter(
+        geometry__bboverlaps=get_tile_bbox(z, x, y, BUFFER)
+    ).order_by()
+
+
+def get_tile_key(z: int, x: int, y: int) -> str:
+    """
+    Cache key for a tile, from the number of events in it and the newest one's ID.
+
+    syncdatahub only replaces the events of features that changed (see :meth:`dashboard.models.WorkZoneEvent.refresh`), and new events always get a higher ID, so a tile's key only changes when a feed with events in it has changed them.
+    """
+
+    events = get_tile_events(z, x, y).aggregate(count=Count("pk"), newest=Max("pk"))
+    return f"event-tile:{z}/{x}/{y}:{events['count']}:{events['newest'] or 0}"
+
+
+def encode_event_tile(z: int, x: int, y: int) -> bytes:
+    layer = Layer("events", z, x, y)
+
+    events = (
+        get_tile_events(z, x, y)
+        .annotate(tile_geometry=Transform("geometry", 3857))
+        .defer("geometry")
+        .order_by("feed", "position")
+    )
+    for event in events.iterator(chunk_size=1000):
+        layer.add_feature(
+            event.pk,
+            event.tile_geometry,
+            {
+                "event_id": event.event_id,
+                "feed": event.feed_id,
+                "event_type": event.event_type,
+                "road_names": json.dumps(event.road_names),
+                "direction": event.direction,
+                "start_date": event.start_date and event.start_date.isoformat(),
+                "end_date": event.end_date and event.end_date.isoformat(),
+                "vehicle_impact": event.vehicle_impact,
+            },
+        )
+
+    return layer.encode()
+
+
+def event_tile(request, z: int, x: int, y: int):
+    """
+    Events from :model:`dashboard.WorkZoneEvent` as a Mapbox Vector Tile, with a single ``events`` layer. Geometries are clipped to the tile and simplified for its zoom level.
+    """
+
+    if not is_valid_tile(z, x, y):
+        raise Http404("No such tile.")
+
+    key = get_tile_key(z, x, y)
+    etag = f'"{key.split(":", 1)[1]}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        tile = cache.get(key)
+        if tile is None:
+            tile = encode_event_tile(z, x, y)
+            cache.set(key, tile, TILE_CACHE_TIMEOUT)
+        response = HttpResponse(tile, content_type="application/vnd.mapbox-vector-tile")
+    else:
+        response = not_modified
+
+    response.headers["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=TILE_MAX_AGE)
+    return response
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Archive
+from .models import Archive, ArchiveBlob, ArchiveDictionary
 
 # Register your models here.
 admin.site.register(Archive)
+admin.site.register(ArchiveBlob)
+admin.site.register(ArchiveDictionary)
@@ -0,0 +1,89 @@
+import json
+import random
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+import zstandard
+
+COMPRESSION_LEVEL = 10
+
+# zstd's default dictionary size
+DICTIONARY_SIZE = 110 * 1024
+
+# Training needs a fair number of samples to find anything worth keeping
+MIN_TRAINING_SAMPLES = 32
+MAX_TRAINING_SAMPLES = 20000
+
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def get_training_samples(payloads: Iterable[Any], rng: random.Random) -> list[bytes]:
+    """
+    Samples for training a dictionary from a feed's archived payloads.
+
+    Each feature is a separate sample, since features are what repeat (the same keys, road names, etc.), both within a payload and from one day to the next.
+    """
+
+    samples: list[bytes] = []
+    for payload in payloads:
+        features = payload.get("features") if isinstance(payload, dict) else None
+        if isinstance(features, list) and features:
+            samples.extend(encode_json(feature) for feature in features)
+            samples.append(encode_json({**payload, "features": []}))
+        else:
+            samples.append(encode_json(payload))
+
+    if len(samples) > MAX_TRAINING_SAMPLES:
+        samples = rng.sample(samples, MAX_TRAINING_SAMPLES)
+
+    return samples
+
+
+def train_dictionary(samples: list[bytes]) -> Optional[bytes]:
+    """Trains a zstd dictionary on samples, or returns None if there aren't enough to train on."""
+
+    if len(samples) < MIN_TRAINING_SAMPLES:
+        return None
+
+    try:
+        dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+    except zstandard.ZstdError:
+        return None
+
+    return dictionary.as_bytes()
+
+
+@lru_cache(maxsize=64)
+def load_dictionary(dictionary_data: Optional[bytes]):
+    if dictionary_data is None:
+        return None
+    return zstandard.ZstdCompressionDict(dictionary_data)
+
+
+def compress_json(data: Any, dictionary_data: Optional[bytes] = None) -> bytes:
+    compressor = zstandard.ZstdCompressor(
+        level=COMPRESSION_LEVEL, dict_data=load_dictionary(dictionary_data)
+    )
+    return compressor.compress(encode_json(data))
+
+
+def decompress(compressed: bytes, dictionary_data: Optional[bytes] = None) -> bytes:
+    """The JSON text of a compressed payload, without parsing it."""
+    decompressor = zstandard.ZstdDecompressor(
+        dict_data=load_dictionary(dictionary_data)
+    )
+    return decompressor.decompress(compressed)
+
+
+def recompress(
+    compressed: bytes,
+    dictionary_data: Optional[bytes],
+    new_dictionary_data: Optional[bytes],
+) -> bytes:
+    """Compresses a payload again with a new dictionary. Used by the recompressarchives command's workers."""
+    compressor = zstandard.ZstdCompressor(
+        level=COMPRESSION_LEVEL, dict_data=load_dictionary(new_dictionary_data)
+    )
+    return compressor.compress(decompress(compressed, dictionary_data))
@@ -0,0 +1,139 @@
+from typing import Any, Optional, TypedDict
+
+from shared.schema_check import get_feature_hash
+
+
+class FeedDelta(TypedDict, total=False):
+    # Everything but the features (see get_shell), only if it changed
+    feed: dict[str, Any]
+    added: dict[str, Any]
+    modified: dict[str, Any]
+    removed: list[str]
+    # Feature ids in order, only if it isn't the previous order with removed features dropped and added ones at the end
+    order: list[str]
+
+
+def get_feature_id(feature: Any) -> Optional[str]:
+    """A feature's id, from the feature itself (WZDx 4.x) or its properties (WZDx 3.x)."""
+
+    if not isinstance(feature, dict):
+        return None
+
+    feature_id = feature.get("id")
+    if feature_id is None and isinstance(feature.get("properties"), dict):
+        feature_id = feature["properties"].get("road_event_id")
+
+    return str(feature_id) if isinstance(feature_id, (str, int)) else None
+
+
+def index_features(feed_data: Any) -> Optional[dict[str, Any]]:
+    """Features by id, in order. None if the feed has no features list, or a feature has no id or a repeated one."""
+
+    features = feed_data.get("features") if isinstance(feed_data, dict) else None
+    if not isinstance(features, list):
+        return None
+
+    indexed: dict[str, Any] = {}
+    for feature in features:
+        feature_id = get_feature_id(feature)
+        if feature_id is None or feature_id in indexed:
+            return None
+        indexed[feature_id] = feature
+
+    return indexed
+
+
+def diff_feeds(previous: Any, current: Any) -> Optional[FeedDelta]:
+    """The features added, modified and removed between two snapshots of a feed, or None if they can't be told apart by id."""
+
+    previous_features = index_features(previous)
+    current_features = index_features(current)
+    if previous_features is None or current_features is None:
+        return None
+
+    delta: FeedDelta = {
+        "added": {
+            feature_id: feature
+            for feature_id, feature in current_features.items()
+            if feature_id not in previous_features
+        },
+        "modified": {
+            feature_id: feature
+            for feature_id, feature in current_features.items()
+            # Compared as canonical JSON, so eg. 1 and true differ, and without the ID_for_dashboard that's numbered by position
+            if feature_id in previous_features
+            and get_feature_hash(previous_features[feature_id])
+            != get_feature_hash(feature)
+        },
+        "removed": [
+            feature_id
+            for feature_id in previous_features
+            if feature_id not in current_features
+        ],
+    }
+
+    shell = get_shell(current)
+    if shell != get_shell(previous):
+        delta["feed"] = shell
+
+    order = list(current_features)
+    if order != get_default_order(previous_features, delta):
+        delta["order"] = order
+
+    return delta
+
+
+def get_shell(feed_data: dict[str, Any]) -> dict[str, Any]:
+    """The feed without its features. The key is kept as a placeholder, so features stay in place among the feed's keys."""
+    return {**feed_data, "features": None}
+
+
+def get_default_order(previous_features: dict[str, Any], delta: FeedDelta) -> list[str]:
+    removed = set(delta["removed"])
+    return [
+        feature_id for feature_id in previous_features if feature_id not in removed
+    ] + list(delta["added"])
+
+
+def apply_delta(previous: Any, delta: FeedDelta) -> Any:
+    """The snapshot after previous, from :func:`diff_feeds`. previous isn't modified."""
+
+    previous_features = index_features(previous)
+    if previous_features is None:
+        raise ValueError("Deltas can only be applied to feeds with feature ids")
+
+    features = {**previous_features, **delta["added"], **delta["modified"]}
+    order = (
+        delta["order"]
+        if "order" in delta
+        else get_default_order(previous_features, delta)
+    )
+
+    return {
+        **delta.get("feed", get_shell(previous)),
+        "features": renumber_dashboard_ids(
+            [features[feature_id] for feature_id in order]
+        ),
+    }
+
+
+def renumber_dashboard_ids(features: list[Any]) -> list[Any]:
+    """Features with their ``ID_for_dashboard`` numbered by position again, as syncdatahub numbers them. Features that change are copied, not modified."""
+
+    renumbered = []
+    for index, feature in enumerate(features):
+        properties = feature.get("properties")
+        if (
+            isinstance(properties, dict)
+            and "ID_for_dashboard" in properties
+            and feature.get("id") is not None
+        ):
+            dashboard_id = f"{feature['id']}_{index}"
+            if properties["ID_for_dashboard"] != dashboard_id:
+                feature = {
+                    **feature,
+                    "properties": {**properties, "ID_for_dashboard": dashboard_id},
+                }
+        renumbered.append(feature)
+
+    return renumbered
@@ -1,55 +1,79 @@
-import io
 import json
-import os
-import tempfile
 import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Iterator
 
-# adapted from
-# https://julianrawcliffe.wordpress.com/2018/02/17/dynamic-in-memory-zip-file-creation/
+from asgiref.sync import sync_to_async
 
+# Flush compressed output to the response once this much has built up
+STREAM_CHUNK_SIZE = 64 * 1024
 
-def makeFile(dir, filename, data):
+
+class ZipStream:
     """
-    A simple function to write a file in a given directory
+    A write-only file for :class:`zipfile.ZipFile`, which keeps what's written until it's taken with :meth:`read_written`.
+
+    It can't seek, so zipfile writes each entry's sizes after its data, and the zip can be sent as it's made.
     """
-    fname = str(dir) + "/" + str(filename)
-    fh = open(fname, "w")
-    fh.write(data)
-    fh.close()
-    return True
 
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
 
-def mkZipFile(values):
+    def read_written(self) -> bytes:
+        written = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return written
+
+
+def stream_zip_file(files: Iterable[tuple[str, Any]]) -> Iterator[bytes]:
     """
-    Function to create a zip file containing the application configuration files
-    To create the zip file, we need to create a memory file (BytesIO))
+    Yields a zip file of JSON files as it's compressed, so only the current file is held in memory.
+
     Params:
-     row: Database row object containing columns for filename and
-     content to be written in the form
-     { {"file1": "Content for file 1}, {"file2": "Different content for file"} }
-    Returns:
-     data: BytesIO object containing the zipped files
+     files: (filename, data) pairs, where data is written as indented JSON
+    """
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
+        for filename, data in files:
+            info = zipfile.ZipInfo(filename, datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+
+            with z.open(info, mode="w") as file:
+                pieces: list[str] = []
+                pieces_size = 0
+                for piece in json.JSONEncoder(indent=4).iterencode(data):
+                    pieces.append(piece)
+                    pieces_size += len(piece)
+                    if pieces_size >= STREAM_CHUNK_SIZE:
+                        file.write("".join(pieces).encode("utf-8"))
+                        pieces = []
+                        pieces_size = 0
+                    if stream.size >= STREAM_CHUNK_SIZE:
+                        yield stream.read_written()
+                file.write("".join(pieces).encode("utf-8"))
+
+    yield stream.read_written()
+
+
+async def iterate_in_thread(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Yields each chunk of a sync iterator as it's made, in the thread that runs sync code.
+
+    Given a sync iterator, Django's ASGI handler reads it all into a list before sending any of it.
     """
 
-    zipdir = tempfile.mkdtemp()
-    oldpath = os.getcwd()
-    os.chdir(zipdir)
-
-    for row in values:
-        makeFile(
-            zipdir,
-            f"{row['id']}.json",
-            json.dumps(row["data"], indent=4),
-        )
-
-    # Create the in-memory zip image
-    data = io.BytesIO()
-    with zipfile.ZipFile(data, mode="w", compression=zipfile.ZIP_DEFLATED) as z:
-        for fname in os.listdir("."):
-            z.write(fname)
-            os.unlink(fname)
-    data.seek(0)
-
-    os.chdir(oldpath)
-    os.rmdir(zipdir)
-    return data
+    done = object()
+    get_next = sync_to_async(next)
+    while (chunk := await get_next(chunks, done)) is not done:
+        yield chunk
@@ -1,23 +1,89 @@
 import json
 import sys
 
-from archive.models import Archive
+from archive.delta import apply_delta, diff_feeds, index_features
+from archive.models import Archive, ArchiveBlob, ArchiveDictionary
 from dashboard.models import Feed
 from django.core.management.base import BaseCommand
+from shared.schema_check import get_content_hash
 
 
 class Command(BaseCommand):
-    help = "Archive all feeds into a separate database table."
+    help = "Archive all feeds into a separate database table. Most archives only store what changed since the feed's previous one, with a full copy every few archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keyframe-interval",
+            type=int,
+            default=30,
+            help="Store a full copy of a feed's data every this many archives (default: 30).",
+        )
 
     def handle(self, *args, **options):
-        for feed in Feed.objects.all():
+        for feed in Feed.objects.select_related("feeddata"):
             self.stdout.write(self.style.NOTICE(f"Archiving {feed.feedname}..."))
             feed_data = feed.feed_data()
             if feed_data:
-                Archive.objects.create(
-                    feed=feed,
-                    data=feed_data,
-                    size=(sys.getsizeof(json.dumps(feed_data)) - sys.getsizeof("")),
-                )
+                self.archive_feed(feed, feed_data, options["keyframe_interval"])
+
+        # Payloads are only kept while an archive refers to them, and dictionaries of deleted feeds while a payload does
+        deleted, _ = ArchiveBlob.objects.filter(archives=None).delete()
+        if deleted:
+            self.stdout.write(f"Removed {deleted} unused archived payloads.")
+        ArchiveDictionary.objects.filter(feed=None, blobs=None).delete()
 
         self.stdout.write(self.style.SUCCESS("Done archiving!"))
+
+    def archive_feed(self, feed: Feed, feed_data, keyframe_interval: int):
+        content_hash = feed.feeddata.content_hash or get_content_hash(  # type: ignore
+            feed_data
+        )
+        size = sys.getsizeof(json.dumps(feed_data)) - sys.getsizeof("")
+
+        previous = Archive.objects.filter(feed=feed).order_by("-pk").first()
+        since_keyframe = (
+            Archive.objects.filter(
+                feed=feed,
+                pk__gt=Archive.objects.filter(feed=feed, is_keyframe=True)
+                .order_by("-pk")
+                .values("pk")[:1],
+            ).count()
+            if previous is not None
+            else 0
+        )
+
+        delta = None
+        if previous is not None and since_keyframe + 1 < keyframe_interval:
+            # An unchanged feed is an empty delta, unless deltas can't be applied to it (features without ids, or with repeated ones). It's then a full copy, which is only stored once anyway
+            if previous.content_hash != content_hash:
+                delta = diff_feeds(previous.data, feed_data)
+            elif index_features(feed_data) is not None:
+                self.stdout.write(
+                    f"Feed {feed.feedname} is unchanged since it was last archived."
+                )
+                delta = {"added": {}, "modified": {}, "removed": []}
+
+        # Only kept if replaying it gives back exactly this feed data (eg. ID_for_dashboard values that aren't numbered by position wouldn't be)
+        if (
+            delta is not None
+            and get_content_hash(apply_delta(previous.data, delta)) != content_hash
+        ):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Changes to {feed.feedname} can't be replayed exactly, storing a full copy."
+                )
+            )
+            delta = None
+
+        if delta is None:
+            blob = ArchiveBlob.store(feed, feed_data, content_hash)
+        else:
+            blob = ArchiveBlob.store(feed, delta, get_content_hash(delta))
+
+        Archive.objects.create(
+            feed=feed,
+            blob=blob,
+            is_keyframe=delta is None,
+            content_hash=content_hash,
+            size=size,
+        )
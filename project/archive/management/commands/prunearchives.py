@@ -0,0 +1,68 @@
+from archive.models import Archive, ArchiveBlob, ArchiveDictionary
+from archive.segments import add_months, get_month, get_month_range
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete archives older than a number of months, one month at a time, so newer months aren't touched."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-months",
+            type=int,
+            required=True,
+            help="Number of months of archives to keep, including the current month.",
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Compact the database file afterwards (SQLite only).",
+        )
+
+    def handle(self, *args, **options):
+        if options["keep_months"] < 1:
+            raise CommandError("At least the current month must be kept.")
+
+        cutoff = add_months(get_month(timezone.now()), 1 - options["keep_months"])
+        cutoff_datetime = get_month_range(cutoff)[0]
+
+        # The first archive each feed keeps can't be a delta on a deleted one
+        pruned = Archive.objects.filter(datetime_archived__lt=cutoff_datetime)
+        for feed_id in pruned.order_by().values_list("feed", flat=True).distinct():
+            first_kept = (
+                Archive.objects.filter(
+                    feed_id=feed_id, datetime_archived__gte=cutoff_datetime
+                )
+                .order_by("datetime_archived", "pk")
+                .first()
+            )
+            if first_kept is not None and not first_kept.is_keyframe:
+                first_kept.make_keyframe()
+                self.stdout.write(
+                    f"Stored a full copy of {feed_id} as of {first_kept.datetime_archived}."
+                )
+
+        for month, archives in pruned.iter_months():
+            with transaction.atomic():
+                deleted, _ = archives.delete()
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Deleted {deleted} archives from {month.strftime('%B %Y')}."
+                )
+            )
+
+        deleted, _ = ArchiveBlob.objects.filter(archives=None).delete()
+        self.stdout.write(f"Removed {deleted} unused archived payloads.")
+        ArchiveDictionary.objects.filter(feed=None, blobs=None).delete()
+
+        if options["vacuum"]:
+            if connection.vendor != "sqlite":
+                raise CommandError("--vacuum is only supported on SQLite.")
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Kept archives from {cutoff.strftime('%B %Y')} on.")
+        )
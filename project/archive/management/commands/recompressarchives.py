@@ -0,0 +1,182 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from archive.compression import get_training_samples, recompress, train_dictionary
+from archive.models import Archive, ArchiveBlob, ArchiveDictionary
+from dashboard.models import Feed
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+
+
+class Command(BaseCommand):
+    help = "Train a compression dictionary on each feed's archive history, and compress its archived payloads again with it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to compress payloads with (default: 1, ie. no worker processes).",
+        )
+        parser.add_argument(
+            "--retrain",
+            action="store_true",
+            help="Train new dictionaries even for feeds that already have one.",
+        )
+        parser.add_argument(
+            "--history",
+            type=int,
+            default=30,
+            help="Number of each feed's most recent payloads to train dictionaries on (default: 30).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Number of payloads to compress and save at once (default: 20).",
+        )
+
+    def handle(self, *args, **options):
+        executor = (
+            ProcessPoolExecutor(max_workers=options["workers"])
+            if options["workers"] > 1
+            else None
+        )
+        rng = random.Random(0)
+        # Dictionaries of the feeds done so far (at most one per feed). Payloads already compressed with one are skipped, so payloads shared by several feeds are only compressed for the first one
+        dictionaries_used: set[int] = set()
+
+        try:
+            for feed in Feed.objects.all():
+                self.stdout.write(
+                    self.style.NOTICE(f"Recompressing {feed.feedname}...")
+                )
+                recent_hashes = self.get_recent_blob_hashes(feed, options["history"])
+                if not recent_hashes:
+                    continue
+
+                dictionary = self.get_dictionary(
+                    feed, recent_hashes, options["retrain"], rng
+                )
+                if dictionary is not None:
+                    dictionaries_used.add(dictionary.pk)
+
+                blobs = ArchiveBlob.objects.filter(
+                    Exists(Archive.objects.filter(feed=feed, blob=OuterRef("pk")))
+                ).exclude(dictionary__in=dictionaries_used)
+                if dictionary is None:
+                    blobs = blobs.exclude(dictionary=None)
+
+                count = self.recompress(
+                    blobs, dictionary, options["batch_size"], executor
+                )
+                self.stdout.write(f"Recompressed {count} payloads.")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # Unused dictionaries are kept only if they're their feed's newest
+        ArchiveDictionary.objects.filter(blobs=None).filter(
+            Q(feed=None)
+            | Exists(
+                ArchiveDictionary.objects.filter(
+                    feed=OuterRef("feed"),
+                    datetime_trained__gt=OuterRef("datetime_trained"),
+                )
+            )
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS("Done recompressing archives!"))
+
+    def get_recent_blob_hashes(self, feed: Feed, history: int) -> list[str]:
+        """Hashes of the feed's most recent distinct archived payloads, newest first."""
+
+        blob_hashes: list[str] = []
+        for blob_hash in (
+            Archive.objects.filter(feed=feed)
+            .order_by("-datetime_archived")
+            .values_list("blob", flat=True)
+            .iterator()
+        ):
+            if blob_hash not in blob_hashes:
+                blob_hashes.append(blob_hash)
+                if len(blob_hashes) >= history:
+                    break
+
+        return blob_hashes
+
+    def get_dictionary(
+        self, feed: Feed, blob_hashes: list[str], retrain: bool, rng: random.Random
+    ) -> Optional[ArchiveDictionary]:
+        dictionary = (
+            ArchiveDictionary.objects.filter(feed=feed)
+            .order_by("-datetime_trained")
+            .first()
+        )
+        if dictionary is not None and not retrain:
+            return dictionary
+
+        blobs = ArchiveBlob.objects.filter(pk__in=blob_hashes).select_related(
+            "dictionary"
+        )
+        samples = get_training_samples((blob.data for blob in blobs), rng)
+        dictionary_data = train_dictionary(samples)
+        if dictionary_data is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Not enough archived data to train a dictionary for {feed.feedname}."
+                )
+            )
+            return dictionary
+
+        return ArchiveDictionary.objects.create(
+            feed=feed, data=dictionary_data, sample_count=len(samples)
+        )
+
+    def recompress(
+        self,
+        blobs,
+        dictionary: Optional[ArchiveDictionary],
+        batch_size: int,
+        executor: Optional[ProcessPoolExecutor],
+    ) -> int:
+        new_dictionary_data = dictionary.dictionary_data() if dictionary else None
+        # Dictionaries the payloads are currently compressed with
+        dictionaries: dict[int, bytes] = {}
+        count = 0
+
+        blobs = blobs.only("content_hash", "compressed_data", "dictionary").order_by(
+            "pk"
+        )
+        last_hash = ""
+        while batch := list(blobs.filter(pk__gt=last_hash)[:batch_size]):
+            last_hash = batch[-1].pk
+
+            for blob in batch:
+                if (
+                    blob.dictionary_id is not None
+                    and blob.dictionary_id not in dictionaries
+                ):
+                    dictionaries[blob.dictionary_id] = ArchiveDictionary.objects.get(
+                        pk=blob.dictionary_id
+                    ).dictionary_data()
+
+            arguments = (
+                [bytes(blob.compressed_data) for blob in batch],
+                [dictionaries.get(blob.dictionary_id) for blob in batch],
+                [new_dictionary_data] * len(batch),
+            )
+            results = (
+                executor.map(recompress, *arguments)
+                if executor is not None
+                else map(recompress, *arguments)
+            )
+            for blob, compressed_data in zip(batch, results):
+                blob.compressed_data = compressed_data
+                blob.dictionary = dictionary
+
+            ArchiveBlob.objects.bulk_update(batch, ["compressed_data", "dictionary"])
+            count += len(batch)
+
+        return count
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:38
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_data_to_blobs(apps, schema_editor):
+    """Stores each distinct archived payload once, hashed the same way as :func:`shared.schema_check.get_content_hash`."""
+    Archive = apps.get_model("archive", "Archive")
+    ArchiveBlob = apps.get_model("archive", "ArchiveBlob")
+
+    stored_hashes = set(ArchiveBlob.objects.values_list("content_hash", flat=True))
+    for archive in Archive.objects.only("id", "data", "size").iterator(chunk_size=100):
+        canonical_json = json.dumps(
+            archive.data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        content_hash = hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
+        if content_hash not in stored_hashes:
+            ArchiveBlob.objects.create(
+                content_hash=content_hash, data=archive.data, size=archive.size
+            )
+            stored_hashes.add(content_hash)
+
+        Archive.objects.filter(pk=archive.pk).update(blob_id=content_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0003_archive_size"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveBlob",
+            fields=[
+                (
+                    "content_hash",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("data", models.JSONField(default=dict)),
+                ("size", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="archive",
+            name="blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="archives",
+                to="archive.archiveblob",
+            ),
+        ),
+        migrations.RunPython(move_data_to_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0004_archiveblob"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="archive",
+            name="data",
+        ),
+        migrations.AlterField(
+            model_name="archive",
+            name="blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="archives",
+                to="archive.archiveblob",
+            ),
+        ),
+    ]
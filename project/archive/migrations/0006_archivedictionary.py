@@ -0,0 +1,79 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:41
+
+import json
+
+import django.db.models.deletion
+import zstandard
+from django.db import migrations, models
+
+
+def compress_blobs(apps, schema_editor):
+    """Compresses existing payloads without a dictionary. recompressarchives trains dictionaries and compresses them again with those."""
+    ArchiveBlob = apps.get_model("archive", "ArchiveBlob")
+
+    compressor = zstandard.ZstdCompressor(level=10)
+    for blob in ArchiveBlob.objects.only("content_hash", "data").iterator(
+        chunk_size=100
+    ):
+        blob.compressed_data = compressor.compress(
+            json.dumps(blob.data, separators=(",", ":"), ensure_ascii=False).encode(
+                "utf-8"
+            )
+        )
+        blob.save(update_fields=["compressed_data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0005_remove_archive_data"),
+        ("dashboard", "0037_feedstatus_intervals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archiveblob",
+            name="compressed_data",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.CreateModel(
+            name="ArchiveDictionary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("datetime_trained", models.DateTimeField(auto_now_add=True)),
+                ("data", models.BinaryField()),
+                ("sample_count", models.IntegerField(default=0)),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="dashboard.feed",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "archive dictionaries",
+            },
+        ),
+        migrations.AddField(
+            model_name="archiveblob",
+            name="dictionary",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="blobs",
+                to="archive.archivedictionary",
+            ),
+        ),
+        migrations.RunPython(compress_blobs, migrations.RunPython.noop),
+    ]
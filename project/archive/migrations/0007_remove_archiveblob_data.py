@@ -0,0 +1,17 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0006_archivedictionary"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="archiveblob",
+            name="data",
+        ),
+    ]
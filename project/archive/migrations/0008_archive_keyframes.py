@@ -0,0 +1,37 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+def copy_content_hashes(apps, schema_editor):
+    """Every archive so far is a full snapshot, so its blob's hash is the hash of its feed data."""
+    Archive = apps.get_model("archive", "Archive")
+    Archive.objects.update(content_hash=models.F("blob_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0007_remove_archiveblob_data"),
+        ("dashboard", "0037_feedstatus_intervals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archive",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="archive",
+            name="is_keyframe",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="archive",
+            index=models.Index(
+                fields=["feed", "is_keyframe"], name="archive_arc_feed_id_bbeab2_idx"
+            ),
+        ),
+        migrations.RunPython(copy_content_hashes, migrations.RunPython.noop),
+    ]
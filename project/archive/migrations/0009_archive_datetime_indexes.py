@@ -0,0 +1,27 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("archive", "0008_archive_keyframes"),
+        ("dashboard", "0037_feedstatus_intervals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="archive",
+            index=models.Index(
+                fields=["datetime_archived"], name="archive_arc_datetim_68db6f_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archive",
+            index=models.Index(
+                fields=["feed", "datetime_archived"],
+                name="archive_arc_feed_id_1c9c1f_idx",
+            ),
+        ),
+    ]
@@ -1,11 +1,164 @@
+import json
+import random
+import sys
+from datetime import date
+from typing import Any, Optional
+
 from dashboard.models import Feed
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
+from .compression import (
+    compress_json,
+    decompress,
+    encode_json,
+    get_training_samples,
+    train_dictionary,
+)
+from .delta import FeedDelta, apply_delta, diff_feeds
+from .segments import get_month_range, iter_months
+
 
 # Create your models here.
+class ArchiveDictionary(models.Model):
+    """
+    A zstd dictionary trained on a feed's archived payloads, which :model:`archive.ArchiveBlob` s are compressed with. Dictionaries never change once trained, since blobs need theirs to be decompressed.
+    """
+
+    feed = models.ForeignKey(
+        Feed,
+        on_delete=models.SET_NULL,
+        null=True,
+    )
+    datetime_trained = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = _("archive dictionaries")
+
+    def __str__(self):
+        return f"{self.feed_id} dictionary trained on {self.datetime_trained}"
+
+    def dictionary_data(self) -> bytes:
+        return bytes(self.data)
+
+    @classmethod
+    def get_for_feed(cls, feed: Feed, sample_data) -> Optional["ArchiveDictionary"]:
+        """The feed's newest dictionary, or a new one trained on sample_data if it has none yet."""
+
+        dictionary = cls.objects.filter(feed=feed).order_by("-datetime_trained").first()
+        if dictionary is not None:
+            return dictionary
+
+        samples = get_training_samples([sample_data], random.Random(0))
+        dictionary_data = train_dictionary(samples)
+        if dictionary_data is None:
+            return None
+
+        return cls.objects.create(
+            feed=feed, data=dictionary_data, sample_count=len(samples)
+        )
+
+
+class ArchiveBlob(models.Model):
+    """
+    Archived feed data, stored once per distinct payload and shared by every :model:`archive.Archive` of it, so unchanged feeds don't add a copy each day.
+
+    Payloads are stored as zstd compressed JSON, with the blob's :model:`archive.ArchiveDictionary` if it has one.
+    """
+
+    content_hash = models.CharField(primary_key=True, max_length=64)
+    compressed_data = models.BinaryField(default=b"")
+    dictionary = models.ForeignKey(
+        ArchiveDictionary,
+        on_delete=models.PROTECT,
+        related_name="blobs",
+        null=True,
+        blank=True,
+    )
+    size = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.content_hash
+
+    @property
+    def data(self):
+        return json.loads(self.json_bytes())
+
+    def json_bytes(self) -> bytes:
+        return decompress(
+            bytes(self.compressed_data),
+            self.dictionary.dictionary_data() if self.dictionary else None,
+        )
+
+    @classmethod
+    def store(cls, feed: Feed, document, content_hash: str) -> "ArchiveBlob":
+        """The blob storing a document (full feed data or a delta), which is compressed and saved if it isn't already stored."""
+
+        blob = cls.objects.filter(content_hash=content_hash).first()
+        if blob is not None:
+            return blob
+
+        dictionary = ArchiveDictionary.get_for_feed(feed, document)
+        return cls.objects.create(
+            content_hash=content_hash,
+            compressed_data=compress_json(
+                document, dictionary.dictionary_data() if dictionary else None
+            ),
+            dictionary=dictionary,
+            size=(sys.getsizeof(json.dumps(document)) - sys.getsizeof("")),
+        )
+
+
+class ArchiveQuerySet(models.QuerySet):
+    def as_of(self, feed: Feed, datetime) -> Optional["Archive"]:
+        """The feed's latest archive at or before datetime."""
+        return (
+            self.filter(feed=feed, datetime_archived__lte=datetime)
+            .order_by("-datetime_archived", "-pk")
+            .first()
+        )
+
+    def in_month(self, month: date):
+        start, end = get_month_range(month)
+        return self.filter(datetime_archived__gte=start, datetime_archived__lt=end)
+
+    def iter_months(self):
+        """
+        Splits the archives into monthly segments, yielding each month and its archives. Each segment is a bounded range of the datetime_archived index, so large exports never scan or hold the whole table at once.
+        """
+
+        bounds = self.order_by().aggregate(
+            first=models.Min("datetime_archived"), last=models.Max("datetime_archived")
+        )
+        for month in iter_months(bounds["first"], bounds["last"]):
+            yield month, self.in_month(month)
+
+    def iter_data(self, chunk_size: int = 20):
+        """
+        Yields each archive with its feed data, fetching chunk_size archives at a time. Archives are ordered by feed, so consecutive deltas are applied one after the other rather than each replayed from its keyframe.
+        """
+
+        previous: Optional[tuple[Archive, Any]] = None
+        for archive in (
+            self.select_related("blob")
+            .prefetch_related("blob__dictionary")
+            .order_by("feed", "pk")
+            .iterator(chunk_size=chunk_size)
+        ):
+            data = archive.reconstruct(previous)
+            previous = (archive, data)
+            yield archive, data
+
+
 class Archive(models.Model):
+    """
+    A daily snapshot of a feed's data. Every few snapshots is a keyframe, with the full feed data in its blob. The others only store the features added, modified and removed since the feed's previous snapshot (see :func:`archive.delta.diff_feeds`), and are reconstructed from the latest keyframe.
+    """
+
     feed = models.ForeignKey(
         Feed,
         on_delete=models.CASCADE,
@@ -13,18 +166,123 @@ class Archive(models.Model):
 
     datetime_archived = models.DateTimeField(auto_now_add=True)
 
-    data = models.JSONField(
-        default=dict,
+    blob = models.ForeignKey(
+        ArchiveBlob,
+        on_delete=models.PROTECT,
+        related_name="archives",
     )
+    is_keyframe = models.BooleanField(default=True)
+    # Hash of the full feed data, the blob's content hash for keyframes
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     size = models.IntegerField(default=0)
 
+    objects = ArchiveQuerySet.as_manager()
+
     class Meta:
         ordering = ["-datetime_archived"]
         verbose_name_plural = _("archives")
+        indexes = [
+            models.Index(fields=["feed", "is_keyframe"]),
+            models.Index(fields=["datetime_archived"]),
+            models.Index(fields=["feed", "datetime_archived"]),
+        ]
 
     def __str__(self):
         return f"{self.feed.issuingorganization} on {self.datetime_archived}"
 
+    @cached_property
+    def data(self):
+        return self.reconstruct()
+
+    def reconstruct(self, previous: Optional[tuple["Archive", Any]] = None):
+        """
+        Feed data as of this archive, by replaying deltas from the latest keyframe.
+
+        If ``previous`` (an earlier archive of the same feed, and its data) is given and there's no keyframe in between, deltas are replayed from it instead.
+        """
+
+        if self.is_keyframe:
+            return self.blob.data
+
+        # Bounded by datetime as well, so only the months in between are searched
+        archives = Archive.objects.filter(
+            feed_id=self.feed_id,
+            datetime_archived__lte=self.datetime_archived,
+            pk__lte=self.pk,
+        )
+        keyframe = (
+            archives.filter(is_keyframe=True)
+            .order_by("-pk")
+            .values("pk", "datetime_archived")
+            .first()
+        )
+        if keyframe is None:
+            raise Archive.DoesNotExist(f"Archive {self.pk} has no keyframe")
+
+        if (
+            previous is not None
+            and previous[0].feed_id == self.feed_id
+            and keyframe["pk"] <= previous[0].pk < self.pk
+        ):
+            data = previous[1]
+            archives = archives.filter(
+                datetime_archived__gte=previous[0].datetime_archived,
+                pk__gt=previous[0].pk,
+            )
+        else:
+            data = None
+            archives = archives.filter(
+                datetime_archived__gte=keyframe["datetime_archived"],
+                pk__gte=keyframe["pk"],
+            )
+
+        for archive in (
+            archives.select_related("blob")
+            .prefetch_related("blob__dictionary")
+            .order_by("pk")
+        ):
+            data = (
+                archive.blob.data
+                if archive.is_keyframe
+                else apply_delta(data, archive.blob.data)
+            )
+
+        return data
+
+    def json_bytes(self) -> bytes:
+        """Feed data as of this archive as JSON. Keyframes are sent as stored, without being parsed and serialized again."""
+
+        if self.is_keyframe:
+            return self.blob.json_bytes()
+
+        return encode_json(self.reconstruct())
+
+    def make_keyframe(self):
+        """Stores this archive's full feed data, so it no longer depends on earlier archives (eg. before they're pruned)."""
+
+        if self.is_keyframe:
+            return
+
+        self.blob = ArchiveBlob.store(self.feed, self.reconstruct(), self.content_hash)
+        self.is_keyframe = True
+        self.save(update_fields=["blob", "is_keyframe"])
+
+    def changes(self) -> Optional[FeedDelta]:
+        """What changed since the feed's previous snapshot, or None if it's the first or features can't be told apart by id."""
+
+        if not self.is_keyframe:
+            return self.blob.data
+
+        previous = (
+            Archive.objects.filter(feed_id=self.feed_id, pk__lt=self.pk)
+            .order_by("-pk")
+            .first()
+        )
+        if previous is None:
+            return None
+
+        return diff_feeds(previous.data, self.data)
+
     def get_absolute_url(self):
         return reverse("archive-details", kwargs={"pk": self.pk})
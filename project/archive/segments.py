@@ -0,0 +1,36 @@
+from datetime import date, datetime, time
+from typing import Iterator, Optional
+
+from django.utils import timezone
+
+# Archives are segmented by calendar month, in the site's time zone
+
+
+def get_month(value: datetime) -> date:
+    """The month (as its first day) a datetime falls in."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_month_range(month: date) -> tuple[datetime, datetime]:
+    """The start of a month, and of the month after it."""
+    return (
+        timezone.make_aware(datetime.combine(month, time.min)),
+        timezone.make_aware(datetime.combine(add_months(month, 1), time.min)),
+    )
+
+
+def iter_months(first: Optional[datetime], last: Optional[datetime]) -> Iterator[date]:
+    """Every month from the one first falls in, to the one last falls in."""
+
+    if first is None or last is None:
+        return
+
+    month = get_month(first)
+    while month <= get_month(last):
+        yield month
+        month = add_months(month, 1)
@@ -6,4 +6,6 @@
     path("", views.ArchiveListView.as_view(), name="archive-list"),
     path("zip", views.download_all_in_zip, name="archive-zip"),
     path("<int:pk>/", views.archive_json, name="archive-details"),
+    path("<int:pk>/changes/", views.archive_changes, name="archive-changes"),
+    path("feeds/<str:feedname>/", views.archive_as_of, name="archive-as-of"),
 ]
@@ -1,18 +1,31 @@
 from typing import Optional, Union
 
+from asgiref.sync import sync_to_async
+from dashboard.models import Feed
 from django.core.paginator import Page, Paginator
-from django.http import FileResponse, HttpResponseBadRequest, JsonResponse
-from django.shortcuts import aget_object_or_404
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
 from django_filters.views import FilterView
 from django_tables2 import SingleTableMixin
 
 from .filter import ArchiveFilter
-from .makefile import mkZipFile
+from .makefile import iterate_in_thread, stream_zip_file
 from .models import Archive
 from .tables import ArchiveTable
 
 # Create your views here.
 
+ONE_YEAR = 365 * 24 * 60 * 60
+
 
 def get_page_button_array(
     paginator: Optional[Paginator], page: Page
@@ -69,16 +82,76 @@ class ArchiveListView(SingleTableMixin, FilterView):
 
 
 async def archive_json(request, pk):
-    data = await aget_object_or_404(Archive, pk=pk)
+    archive = await aget_object_or_404(
+        Archive.objects.select_related("blob__dictionary"), pk=pk
+    )
+
+    # Archives never change, so their feed data's hash is a strong validator
+    etag = f'"{archive.content_hash}"' if archive.content_hash else None
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = HttpResponse(
+            await sync_to_async(archive.json_bytes)(),
+            content_type="application/json",
+        )
+        response.headers["Content-Length"] = str(len(response.content))
+    else:
+        response = not_modified
+
+    if etag is not None:
+        response.headers["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+
+    return response
+
+
+def archive_changes(request, pk):
+    """What changed in an archive since the feed's previous one (see :func:`archive.delta.diff_feeds`)."""
+
+    archive = get_object_or_404(Archive, pk=pk)
+
+    changes = archive.changes()
+    if changes is None:
+        return HttpResponseBadRequest(
+            "Changes are only available for feeds whose features have ids, since their previous archive"
+        )
 
-    return JsonResponse(data.data)
+    return JsonResponse(changes)
+
+
+def archive_as_of(request, feedname):
+    """A feed's data as of the datetime in the ``datetime`` parameter (ISO 8601, local time if no offset is given), reconstructed from the archive."""
+
+    feed = get_object_or_404(Feed, pk=feedname)
+
+    try:
+        as_of = parse_datetime(request.GET.get("datetime", ""))
+    except ValueError:
+        as_of = None
+    if as_of is None:
+        return HttpResponseBadRequest("Invalid datetime")
+    if timezone.is_naive(as_of):
+        as_of = timezone.make_aware(as_of)
+
+    archive = Archive.objects.as_of(feed, as_of)
+    if archive is None:
+        raise Http404(f"No archive of {feedname} at or before {as_of.isoformat()}")
+
+    return JsonResponse(archive.data)
 
 
 def download_all_in_zip(request):
     filter = ArchiveFilter(request.GET, queryset=Archive.objects.all())
 
-    zfile = mkZipFile(filter.qs.values("id", "data"))
-    if not zfile:
-        return HttpResponseBadRequest("Invalid zip file")
-
-    return FileResponse(zfile, as_attachment=True, filename="download.zip")
+    # Streamed as it's compressed, a month and a few archives at a time
+    return StreamingHttpResponse(
+        iterate_in_thread(
+            stream_zip_file(
+                (f"{archive.pk}.json", data)
+                for _, archives in filter.qs.iter_months()
+                for archive, data in archives.iter_data()
+            )
+        ),
+        content_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="download.zip"'},
+    )
@@ -4,7 +4,7 @@
 from django.contrib.gis.db import models
 
 # Register your models here.
-from .models import APIKey, Feed, FeedData, FeedStatus
+from .models import APIKey, Feed, FeedData, FeedStatus, FeedSummary, SchemaCheck
 
 
 class ReadOnlyAdmin(admin.ModelAdmin):
@@ -78,6 +78,15 @@ class FeedDataAdminInline(ReadOnlyStackedAdmin):
     model = FeedData
 
 
+class FeedSummaryAdminInline(ReadOnlyStackedAdmin):
+    model = FeedSummary
+
+
+class SchemaCheckAdminInline(ReadOnlyStackedAdmin):
+    model = SchemaCheck
+    exclude = ["feature_errors"]
+
+
 class FeedStatusAdminInline(ReadOnlyTabularAdmin):
     model = FeedStatus
 
@@ -95,4 +104,10 @@ def has_delete_permission(self, request, obj=None):
 
 @admin.register(Feed)
 class FeedAdmin(ReadOnlyAdmin):
-    inlines = [APIKeyInline, FeedStatusAdminInline, FeedDataAdminInline]
+    inlines = [
+        APIKeyInline,
+        FeedStatusAdminInline,
+        FeedDataAdminInline,
+        FeedSummaryAdminInline,
+        SchemaCheckAdminInline,
+    ]
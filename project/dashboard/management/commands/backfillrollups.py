@@ -0,0 +1,75 @@
+import math
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from dashboard.models import FeedStatus, FeedStatusRollup
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+def spread_checks(first: datetime, last: datetime, count: int) -> Counter[date]:
+    """
+    Number of checks on each day, for ``count`` checks spread evenly from ``first`` to ``last``, as checkfeeds would have counted them in rollups one by one.
+    """
+
+    checks: Counter[date] = Counter()
+    first_day, last_day = timezone.localdate(first), timezone.localdate(last)
+    if count <= 1 or first_day >= last_day:
+        checks[first_day] = count
+        return checks
+
+    step = (last - first) / (count - 1)
+    counted = 0
+    day = first_day
+    while day < last_day:
+        next_day = day + timedelta(days=1)
+        next_day_start = timezone.make_aware(datetime.combine(next_day, time.min))
+        # Checks before the next day starts
+        before = min(count, math.ceil((next_day_start - first) / step))
+        if before > counted:
+            checks[day] = before - counted
+            counted = before
+        day = next_day
+
+    if count > counted:
+        checks[last_day] = count - counted
+    return checks
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily feed status rollups from all stored feed statuses. Checks in a status spanning several days are spread over those days in proportion to time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollups to insert per query (default: 1000).",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        statuses = FeedStatus.objects.values_list(
+            "feed", "status_type", "datetime_checked", "last_checked", "check_count"
+        ).order_by()
+
+        daily_counts: Counter[tuple[str, date, str]] = Counter()
+        for feed, status_type, first, last, count in statuses.iterator():
+            for day, day_count in spread_checks(first, last, count).items():
+                daily_counts[(feed, day, status_type)] += day_count
+
+        FeedStatusRollup.objects.all().delete()
+        rollups = FeedStatusRollup.objects.bulk_create(
+            (
+                FeedStatusRollup(
+                    feed_id=feed, date=day, status_type=status_type, count=count
+                )
+                for (feed, day, status_type), count in daily_counts.items()
+            ),
+            batch_size=options["batch_size"],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {len(rollups)} feed status rollups.")
+        )
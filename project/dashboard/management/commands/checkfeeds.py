@@ -1,23 +1,61 @@
 from collections import Counter
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, TypedDict
 
-import iso8601
+import django
 import requests
 from dashboard.models import (
     Feed,
+    FeedPointCluster,
+    FeedStatus,
+    FeedStatusRollup,
+    FeedSummary,
     OfflineErrorStatus,
     OKStatus,
     OutdatedErrorStatus,
+    SchemaCheck,
     SchemaErrorStatus,
     StaleErrorStatus,
 )
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
 from shared.schema_check import (
-    find_all_instances_key,
-    get_formatted_errors,
-    get_version_schema_errors,
+    SchemaErrorRecord,
+    format_as_index,
+    get_feature_schema_errors,
 )
 
+
+class SchemaErrorSummary(TypedDict):
+    most_common_type: str
+    most_common_field: str
+    most_common_count: int
+    total_errors: int
+    estimated: bool
+
+
+class PendingFeedStatus(TypedDict):
+    feed: Feed
+    feed_status: FeedStatus
+    details: str
+    schema_check: Optional[SchemaCheck]
+    datetime_checked: datetime
+
+
+class FeedDataCheck(TypedDict):
+    schema_errors: SchemaErrorSummary
+    feature_errors: Optional[dict[str, list[SchemaErrorRecord]]]
+
+
 # FEED CHECKER FUNCTIONS
 
 
@@ -47,130 +85,424 @@ def is_offline(feed: Feed) -> bool:
     )
 
 
-def get_feed_schema_errors(feed: Feed):
-    feed_data = feed.feed_data()
-    feed_version = feed.version
+def summarize_schema_errors(
+    errors: list[tuple[SchemaErrorRecord, float]], feedname: str, estimated: bool
+) -> SchemaErrorSummary:
+    """
+    Reduces a list of schema errors (each with how many errors it stands for) to the most common error (and its field), and how many there are.
+    """
 
-    return get_version_schema_errors(feed_data, feed_version)
+    summary: SchemaErrorSummary = {
+        "most_common_type": "",
+        "most_common_field": "",
+        "most_common_count": 0,
+        "total_errors": round(sum(weight for _, weight in errors)),
+        "estimated": estimated,
+    }
 
+    if len(errors) == 0:
+        return summary
 
-def outdated(feed: Feed):
-    """If feed events haven't been updated in the last 14 days. Assumes feed matches the schema."""
-    fourteen_days_ago = datetime.now(tz=timezone.utc) - timedelta(days=14)
+    formatted_errors = sorted(
+        (error["message"], format_as_index(feedname, error["path"]), weight)
+        for error, weight in errors
+    )
 
-    # Recursively get all instances of "update_date"
-    all_update_dates = [
-        iso8601.parse_date(update_date_string, default_timezone=timezone.utc)
-        for update_date_string in find_all_instances_key(
-            feed.feed_data(), "update_date"  # type: ignore
-        )
-    ]
+    error_counts: Counter[str] = Counter()
+    error_fields: dict[str, str] = {}
+    for message, field, weight in formatted_errors:
+        error_counts[message] += weight
+        error_fields.setdefault(message, field)
+
+    most_common_type, most_common_count = error_counts.most_common(1)[0]
+    summary["most_common_type"] = most_common_type
+    summary["most_common_count"] = round(most_common_count)
+    summary["most_common_field"] = error_fields[most_common_type]
+
+    return summary
+
+
+def get_cached_schema_errors(feed: Feed) -> Optional[SchemaErrorSummary]:
+    """
+    Returns the feed's last schema validation result, if feed data and version haven't changed since.
+    """
+
+    content_hash = feed.feeddata.content_hash  # type: ignore
+
+    try:
+        schema_check = feed.schemacheck  # type: ignore
+    except ObjectDoesNotExist:
+        return None
+
+    if not (
+        content_hash
+        and schema_check.content_hash == content_hash
+        and schema_check.version == feed.version
+    ):
+        return None
+
+    return {
+        "most_common_type": schema_check.most_common_type,
+        "most_common_field": schema_check.most_common_field,
+        "most_common_count": schema_check.most_common_count,
+        "total_errors": schema_check.total_errors,
+        "estimated": schema_check.estimated,
+    }
+
+
+def get_known_feature_errors(feed: Feed) -> dict[str, list[SchemaErrorRecord]]:
+    """Schema errors of each feature (by hash) from the feed's last validation, if the version hasn't changed since."""
+
+    try:
+        schema_check = feed.schemacheck  # type: ignore
+    except ObjectDoesNotExist:
+        return {}
 
-    is_outdated = (
-        all([update_date < fourteen_days_ago for update_date in all_update_dates])
-        if len(all_update_dates) > 0
-        else False
+    if schema_check.version != feed.version:
+        return {}
+
+    return schema_check.feature_errors
+
+
+def build_schema_check(
+    feed: Feed,
+    summary: SchemaErrorSummary,
+    feature_errors: dict[str, list[SchemaErrorRecord]],
+) -> SchemaCheck:
+    """A schema validation result for :model:`dashboard.SchemaCheck`, for reuse while the feed data stays the same. Saved by :meth:`Command.write_feed_statuses`."""
+
+    return SchemaCheck(
+        feed=feed,
+        content_hash=feed.feeddata.content_hash,  # type: ignore
+        version=feed.version,
+        feature_errors=feature_errors,
+        **summary,
     )
 
+
+def outdated(feed_summary: Optional[FeedSummary]):
+    """If feed events haven't been updated in the last 14 days. Assumes feed matches the schema."""
+    fourteen_days_ago = datetime.now(tz=timezone.utc) - timedelta(days=14)
+
+    latest_update_date = feed_summary.latest_update_date if feed_summary else None
+
     return (
-        is_outdated,
-        max(all_update_dates),
+        latest_update_date is not None and latest_update_date < fourteen_days_ago,
+        latest_update_date,
     )
 
 
-def stale(feed: Feed):
+def stale(feed_summary: Optional[FeedSummary]):
     """If feed contains events that ended more than 14 days ago. Assumes feed matches the schema."""
     fourteen_days_ago = datetime.now(tz=timezone.utc) - timedelta(days=14)
 
-    # Recursively get all instances of "update_date"
-    all_end_dates = [
-        iso8601.parse_date(end_date_string, default_timezone=timezone.utc)
-        for end_date_string in find_all_instances_key(feed.feed_data(), "end_date")  # type: ignore
-    ]
+    if feed_summary is None:
+        return []
 
-    stale_events = [
-        end_date for end_date in all_end_dates if end_date < fourteen_days_ago
-    ]
+    return feed_summary.end_dates_before(fourteen_days_ago)
 
-    return stale_events
+
+def check_feed_data(
+    feed_data: dict[str, Any],
+    version: str,
+    feedname: str,
+    known_feature_errors: Optional[dict[str, list[SchemaErrorRecord]]] = None,
+    max_errors: Optional[int] = None,
+    sample_size: Optional[int] = None,
+) -> FeedDataCheck:
+    """
+    Validates feed data against its schema. Has no database access, so it can be run in a worker process.
+
+    Only features that aren't in ``known_feature_errors`` are validated, and ``max_errors``/``sample_size`` bound the work done for badly broken feeds.
+    """
+
+    feature_schema_errors = get_feature_schema_errors(
+        feed_data, version, known_feature_errors, max_errors, sample_size
+    )
+
+    return {
+        "schema_errors": summarize_schema_errors(
+            feature_schema_errors["errors"],
+            feedname,
+            feature_schema_errors["estimated"],
+        ),
+        "feature_errors": feature_schema_errors["feature_errors"],
+    }
 
 
 class Command(BaseCommand):
     help = "Check every feed for their current status."
 
-    def handle(self, *args, **options):
-        for feed in Feed.objects.all():
-            self.stdout.write(self.style.NOTICE(f"Checking {feed.feedname}..."))
-            previous_status = feed.feed_status()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to validate feeds with (default: 1, ie. no worker processes).",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=10000,
+            help="Stop validating a feed after this many schema errors, and estimate the rest (default: 10000).",
+        )
+        parser.add_argument(
+            "--sample-features",
+            type=int,
+            default=None,
+            help="Only validate this many new features per feed, and estimate the rest (default: validate all).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of feeds to read per query, and to write statuses for per transaction (default: 100).",
+        )
+
+    def get_cached_check(self, feed: Feed) -> Optional[FeedDataCheck]:
+        """The feed's last check, if its feed data and version haven't changed since. Cache hits are handled here, so their feed data never goes to a worker."""
+
+        cached_schema_errors = get_cached_schema_errors(feed)
+        if cached_schema_errors is None:
+            return None
+
+        return {"schema_errors": cached_schema_errors, "feature_errors": None}
 
-            # OFFLINE
+    def get_check_arguments(self, feed: Feed):
+        """Arguments to :func:`check_feed_data` for a feed."""
+
+        return (
+            feed.feed_data(),
+            feed.version,
+            feed.feedname,
+            get_known_feature_errors(feed),
+            self.max_errors,
+            self.sample_size,
+        )
+
+    def iter_feed_checks(self, feeds):
+        for feed in feeds:
+            self.stdout.write(self.style.NOTICE(f"Checking {feed.feedname}..."))
             if is_offline(feed):
+                yield feed, None, False
+            elif (cached_check := self.get_cached_check(feed)) is not None:
+                yield feed, cached_check, True
+            else:
+                yield feed, check_feed_data(*self.get_check_arguments(feed)), False
+
+    def iter_feed_checks_in_pool(self, feeds, workers: int):
+        """Same as :meth:`iter_feed_checks`, but feed data is checked in a process pool. Results are yielded as they complete."""
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=django.setup
+        ) as executor:
+            pending: dict[Future, Feed] = {}
+
+            for feed in feeds:
+                self.stdout.write(self.style.NOTICE(f"Checking {feed.feedname}..."))
+                if is_offline(feed):
+                    yield feed, None, False
+                    continue
+
+                cached_check = self.get_cached_check(feed)
+                if cached_check is not None:
+                    yield feed, cached_check, True
+                    continue
+
+                future = executor.submit(
+                    check_feed_data, *self.get_check_arguments(feed)
+                )
+                pending[future] = feed
+
+                # Limit how many feeds' data are held in memory at once
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result(), False
+
+            for future in as_completed(pending):
+                yield pending.pop(future), future.result(), False
+
+    def build_feed_status(
+        self, feed: Feed, feed_data_check: Optional[FeedDataCheck], reused: bool
+    ) -> PendingFeedStatus:
+        """Works out a feed's new status from its check. Nothing is written until :meth:`write_feed_statuses`."""
+
+        datetime_checked = datetime.now(tz=timezone.utc)
+        schema_check = None
+
+        # OFFLINE
+        if feed_data_check is None:
+            self.stdout.write(self.style.WARNING(f"Feed {feed.feedname} is offline."))
+            feed_status = OfflineErrorStatus(feed=feed)
+
+        else:
+            schema_errors = feed_data_check["schema_errors"]
+            if not reused:
+                schema_check = build_schema_check(
+                    feed, schema_errors, feed_data_check["feature_errors"] or {}
+                )
+
+            # Time based checks assume the feed matches the schema, and use the facts collected at ingest
+            is_outdated, latest_update, stale_events = False, None, []
+            if schema_errors["total_errors"] == 0:
+                feed_summary = feed.feed_summary()
+                is_outdated, latest_update = outdated(feed_summary)
+                if not is_outdated:
+                    stale_events = stale(feed_summary)
+
+            # ERROR
+            if schema_errors["total_errors"] > 0:
                 self.stdout.write(
-                    self.style.WARNING(f"Feed {feed.feedname} is offline.")
+                    self.style.WARNING(
+                        f"Feed {feed.feedname} has {'about ' if schema_errors['estimated'] else ''}{schema_errors['total_errors']} error{'s' if schema_errors['total_errors'] > 1 else ''}{' (unchanged)' if reused else ''}."
+                    )
                 )
-                feed_status = OfflineErrorStatus.objects.create(feed=feed)
 
+                feed_status = SchemaErrorStatus(feed=feed, **schema_errors)
+
+            # OUTDATED
+            elif is_outdated:
+                self.stdout.write(
+                    self.style.WARNING(f"Feed {feed.feedname} is outdated.")
+                )
+                feed_status = OutdatedErrorStatus(feed=feed, update_date=latest_update)
+
+            # STALE
+            elif len(stale_events) > 0:
+                self.stdout.write(self.style.WARNING(f"Feed {feed.feedname} is stale."))
+                feed_status = StaleErrorStatus(
+                    feed=feed,
+                    latest_end_date=max(stale_events),
+                    amount_events_before_end_date=len(stale_events),
+                )
+
+            # OK!
             else:
-                # ERROR
-                errors = get_feed_schema_errors(feed)
-                if len(errors) > 0:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Feed {feed.feedname} has {len(errors)} error{'s' if len(errors) > 1 else ''}."
-                        )
-                    )
-                    formatted_errors = get_formatted_errors(errors, feed.feedname)
-                    feed_error_messages: tuple[list[str], list[str]] = list(zip(*formatted_errors))  # type: ignore
-
-                    most_common_type, most_common_count = Counter(
-                        feed_error_messages[0]
-                    ).most_common(1)[0]
-                    most_common_field = feed_error_messages[1][
-                        feed_error_messages[0].index(most_common_type)
-                    ]
-
-                    feed_status = SchemaErrorStatus.objects.create(
-                        feed=feed,
-                        most_common_type=most_common_type,
-                        most_common_field=most_common_field,
-                        most_common_count=most_common_count,
-                        total_errors=len(errors),
-                    )
+                self.stdout.write(self.style.SUCCESS(f"Feed {feed.feedname} is ok."))
+                feed_status = OKStatus(feed=feed)
+
+        return {
+            "feed": feed,
+            "feed_status": feed_status,
+            "details": feed_status.details(),
+            "schema_check": schema_check,
+            "datetime_checked": datetime_checked,
+        }
+
+    @transaction.atomic
+    def write_feed_statuses(self, pending_statuses: list[PendingFeedStatus]):
+        """
+        Records the checks of a batch of feeds in one transaction. If a feed's status and details haven't changed, only its latest :model:`dashboard.FeedStatus` is extended. Otherwise a new one is created, and copied onto the feed.
+        """
+
+        SchemaCheck.objects.bulk_create(
+            [
+                pending["schema_check"]
+                for pending in pending_statuses
+                if pending["schema_check"] is not None
+            ],
+            update_conflicts=True,
+            unique_fields=["feed"],
+            update_fields=[
+                "content_hash",
+                "version",
+                "datetime_checked",
+                "most_common_type",
+                "most_common_field",
+                "most_common_count",
+                "total_errors",
+                "estimated",
+                "feature_errors",
+            ],
+        )
 
-                else:
-                    # OUTDATED
-                    is_outdated, latest_update = outdated(feed)
-                    if is_outdated:
-                        self.stdout.write(
-                            self.style.WARNING(f"Feed {feed.feedname} is outdated.")
-                        )
-                        feed_status = OutdatedErrorStatus.objects.create(
-                            feed=feed, update_date=latest_update
-                        )
-                    else:
-                        # STALE
-                        stale_events = stale(feed)
-                        if len(stale_events) > 0:
-                            self.stdout.write(
-                                self.style.WARNING(f"Feed {feed.feedname} is stale.")
-                            )
-                            feed_status = StaleErrorStatus.objects.create(
-                                feed=feed,
-                                end_date=max(stale_events),
-                                amount_events_before_end_date=len(stale_events),
-                            )
-                        else:
-                            # OK!
-                            self.stdout.write(
-                                self.style.SUCCESS(f"Feed {feed.feedname} is ok.")
-                            )
-                            feed_status = OKStatus.objects.create(feed=feed)
+        FeedStatusRollup.add_checks(
+            (
+                pending["feed"],
+                pending["feed_status"].status_type,
+                pending["datetime_checked"],
+            )
+            for pending in pending_statuses
+        )
+
+        extended_statuses: list[FeedStatus] = []
+        updated_feeds: list[Feed] = []
+
+        for pending in pending_statuses:
+            feed, feed_status = pending["feed"], pending["feed_status"]
+
+            if (
+                feed.latest_status_pk is not None  # type: ignore
+                and feed.status_type == feed_status.status_type
+                and feed.status_details == pending["details"]
+            ):
+                extended_statuses.append(
+                    FeedStatus(
+                        pk=feed.latest_status_pk,  # type: ignore
+                        last_checked=pending["datetime_checked"],
+                        check_count=F("check_count") + 1,
+                    )
+                )
+                continue
 
             if (
-                previous_status is not None
-                and previous_status.status_type == feed_status.status_type
+                feed.status_since is not None
+                and feed.status_type == feed_status.status_type
             ):
-                feed_status.status_since = previous_status.status_since
-                feed_status.save()
+                feed_status.status_since = feed.status_since
+            else:
+                feed_status.status_since = pending["datetime_checked"]
+
+            # Statuses use multi-table inheritance, so they can't be bulk created
+            feed_status.last_checked = pending["datetime_checked"]
+            feed_status.save()
+
+            feed.copy_status(feed_status, pending["details"])
+            updated_feeds.append(feed)
+
+        FeedStatus.objects.bulk_update(
+            extended_statuses, ["last_checked", "check_count"]
+        )
+        Feed.objects.bulk_update(
+            updated_feeds, ["status_type", "status_since", "status_details"]
+        )
+
+    def handle(self, *args, **options):
+        # Feeds with everything needed to check them, in one query streamed in chunks
+        feeds = (
+            Feed.objects.select_related("feeddata", "feedsummary", "schemacheck")
+            .annotate(
+                latest_status_pk=Subquery(
+                    FeedStatus.objects.filter(feed=OuterRef("pk"))
+                    .order_by("-datetime_checked")
+                    .values("pk")[:1]
+                )
+            )
+            .iterator(chunk_size=options["batch_size"])
+        )
+
+        self.max_errors = options["max_errors"]
+        self.sample_size = options["sample_features"]
+
+        if options["workers"] > 1:
+            feed_checks = self.iter_feed_checks_in_pool(feeds, options["workers"])
+        else:
+            feed_checks = self.iter_feed_checks(feeds)
+
+        pending_statuses: list[PendingFeedStatus] = []
+        for feed, feed_data_check, reused in feed_checks:
+            pending_statuses.append(
+                self.build_feed_status(feed, feed_data_check, reused)
+            )
+            if len(pending_statuses) >= options["batch_size"]:
+                self.write_feed_statuses(pending_statuses)
+                pending_statuses = []
+
+        self.write_feed_statuses(pending_statuses)
+
+        # The feeds map's clusters count feeds by status, so they're rebuilt with the new statuses
+        count = FeedPointCluster.rebuild()
+        self.stdout.write(f"Rebuilt {count} feed point clusters.")
 
-        self.style.SUCCESS("Finished analyzing feeds!")
+        self.stdout.write(self.style.SUCCESS("Finished analyzing feeds!"))
@@ -0,0 +1,122 @@
+import random
+
+from dashboard.models import FeedData
+from django.core.management.base import BaseCommand, CommandError
+from shared.schema_check import (
+    FEATURE_POINTER,
+    REGISTRY,
+    VERSION_TO_SCHEMA,
+    get_compiled_module_name,
+    get_fast_validator,
+    get_feature_validator,
+    get_version_validator,
+    is_valid_fast,
+)
+from shared.schema_compile import COMPILED_FOLDER, compile_schema_to_code, mutate
+
+
+def write_compiled_validators():
+    """Writes generated validator modules for every schema version (and its features) into shared/compiled/."""
+
+    COMPILED_FOLDER.mkdir(exist_ok=True)
+    (COMPILED_FOLDER / "__init__.py").write_text(
+        '"""Generated by manage.py compileschemas, do not edit."""\n'
+    )
+
+    for version, uri in VERSION_TO_SCHEMA.items():
+        for feature in [False, True]:
+            code = compile_schema_to_code(
+                REGISTRY.contents(uri), uri, FEATURE_POINTER if feature else None
+            )
+            module_name = get_compiled_module_name(version, feature)
+            (COMPILED_FOLDER / f"{module_name}.py").write_text(code)
+
+
+def is_valid_reference(data, version: str, feature: bool = False) -> bool:
+    validator = (
+        get_feature_validator(version) if feature else get_version_validator(version)
+    )
+    return next(validator.iter_errors(data), None) is None
+
+
+def validators_agree(data, version: str) -> bool:
+    """If the generated validators give the same result as jsonschema, for the feed and each of its features."""
+
+    if is_valid_fast(data, version) != is_valid_reference(data, version):
+        return False
+
+    features = data.get("features") if isinstance(data, dict) else None
+    if not isinstance(features, list):
+        return True
+
+    return all(
+        is_valid_fast(feature, version, feature=True)
+        == is_valid_reference(feature, version, feature=True)
+        for feature in features
+    )
+
+
+class Command(BaseCommand):
+    help = "Generate fast validators for the bundled WZDx/CWZ schemas, and check they agree with jsonschema."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Compare the generated validators against jsonschema on every stored feed.",
+        )
+        parser.add_argument(
+            "--mutations",
+            type=int,
+            default=10,
+            help="Number of randomly mutated copies of each feed to compare as well.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed for the mutated copies.",
+        )
+
+    def handle(self, *args, **options):
+        write_compiled_validators()
+        get_fast_validator.cache_clear()
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote compiled validators to {COMPILED_FOLDER}")
+        )
+
+        if options["verify"]:
+            self.verify(options["mutations"], random.Random(options["seed"]))
+
+    def verify(self, mutations: int, rng: random.Random):
+        checked = 0
+        mismatches = 0
+
+        for feed_data in FeedData.objects.filter(response_code=200).select_related(
+            "feed"
+        ):
+            version = feed_data.feed.version
+            if version not in VERSION_TO_SCHEMA or not feed_data.feed_data:
+                continue
+
+            samples = [feed_data.feed_data] + [
+                mutate(feed_data.feed_data, rng) for _ in range(mutations)
+            ]
+            for sample in samples:
+                checked += 1
+                if not validators_agree(sample, version):
+                    mismatches += 1
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"Validators disagree for {feed_data.feed.feedname} (version {version})"
+                        )
+                    )
+
+        if mismatches:
+            raise CommandError(
+                f"{mismatches} of {checked} feeds validated differently than jsonschema"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Validators agree on all {checked} feeds")
+        )
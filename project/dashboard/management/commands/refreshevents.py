@@ -0,0 +1,27 @@
+from dashboard.models import Feed, WorkZoneEvent
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild the work zone events table from all stored feed data."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "feeds",
+            nargs="*",
+            help="Names of the feeds to rebuild (default: all feeds).",
+        )
+
+    def handle(self, *args, **options):
+        feeds = Feed.objects.select_related("feeddata")
+        if options["feeds"]:
+            feeds = feeds.filter(feedname__in=options["feeds"])
+
+        for feed in feeds:
+            with transaction.atomic():
+                WorkZoneEvent.objects.filter(feed=feed).delete()
+                count = WorkZoneEvent.refresh(feed, feed.feed_data())
+            self.stdout.write(f"Stored {count} events for {feed.feedname}.")
+
+        self.stdout.write(self.style.SUCCESS("Rebuilt work zone events."))
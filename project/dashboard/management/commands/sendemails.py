@@ -1,8 +1,7 @@
 from datetime import date, datetime, timedelta
 
-from dashboard.models import Feed, FeedStatus
+from dashboard.models import Feed, FeedStatusRollup
 from django.contrib.auth.models import User
-from django.contrib.gis.db.models import Count
 from django.core.mail import send_mail
 from django.core.management.base import BaseCommand
 from django.template.loader import render_to_string
@@ -21,28 +20,9 @@ def handle(self, *args, **options):
         enddate = date.today()
         startdate = enddate - timedelta(days=14)
 
-        status_summary: dict[str, list[tuple[str, str]]] = {}
-        for feed in feed_context:
-
-            total_status_count = FeedStatus.objects.filter(
-                feed=feed.pk, datetime_checked__range=[startdate, enddate]
-            ).count()
-
-            status_summary[feed.pk] = [
-                (
-                    FeedStatus.StatusType(status["status_type"]).label,
-                    str(round(status["count"] / total_status_count * 100, 2)),
-                )
-                for status in (
-                    FeedStatus.objects.filter(
-                        feed=feed.pk,
-                        datetime_checked__range=[startdate, enddate],
-                    )
-                    .values("status_type")
-                    .annotate(count=Count("status_type"))
-                    .order_by("-count")
-                )
-            ]
+        status_summary = FeedStatusRollup.objects.filter(
+            date__gte=startdate, date__lt=enddate
+        ).status_summary()
 
         subject, from_email, to = (
             f"WZDx Status: {datetime.today().strftime('%Y-%m-%d')}",
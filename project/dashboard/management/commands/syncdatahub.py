@@ -1,19 +1,46 @@
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Literal, Optional, TypedDict, Union
+from typing import Any, Literal, Optional, TypedDict, Union
+from urllib.parse import urlsplit
 from zoneinfo import ZoneInfo
 
 import requests
 import semver
-from dashboard.models import APIKey, Feed, FeedData
+from dashboard.models import APIKey, Feed, FeedData, FeedPointCluster, WorkZoneEvent
 from django.contrib.gis.geos import Point
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from localflavor.us import us_states
+from shared.json_stream import LimitedReader, PayloadTooLargeError, load_feed_json
+from shared.schema_check import get_content_hash
 
 eastern_tz = ZoneInfo("America/New_York")
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Feed fields that come from the DataHub registry, and are overwritten on every sync
+REGISTRY_FIELDS = [
+    "state",
+    "issuingorganization",
+    "url",
+    "format",
+    "active",
+    "datafeed_frequency_update",
+    "version",
+    "sdate",
+    "edate",
+    "needapikey",
+    "apikeyurl",
+    "pipedtosandbox",
+    "lastingestedtosandbox",
+    "pipedtosocrata",
+    "socratadatasetid",
+    "geocoded_column",
+]
+
 
 class PointJSON(TypedDict):
     type: Literal["Point"]
@@ -40,20 +67,50 @@ class DataHubResponse(TypedDict):
     geocoded_column: PointJSON
 
 
-def get_api_key(feed_name: str):
-    try:
-        api_key = APIKey.objects.get(feed__pk=feed_name).key
+class FeedDataResult(TypedDict):
+    response_code: int
+    feed_data: Any
+    error: Optional[str]
+    not_modified: bool
+    etag: str
+    last_modified: str
+    content_hash: str
+
+
+def get_api_key(feed_name: str, api_keys: dict[str, str]):
+    """Looks up a feed's API key in ``api_keys`` (stored keys by feed name), falling back to the environment."""
+
+    if feed_name in api_keys:
+        api_key = api_keys[feed_name]
         in_db = True
         if not api_key:
             in_db = False
             api_key = os.environ.get(feed_name)
-    except APIKey.DoesNotExist:
+    else:
         api_key = os.environ.get(feed_name)
         in_db = None
 
     return (in_db, api_key)
 
 
+def check_registry_fields(feed: Feed):
+    """Raises ``ValueError`` for values the database would reject, so one bad registry entry can't fail the whole upsert."""
+
+    for field_name in ["feedname", *REGISTRY_FIELDS]:
+        field = Feed._meta.get_field(field_name)
+        value = getattr(feed, field.attname)
+        if value is None and not field.null:
+            raise ValueError(f"{field_name} is required")
+        if (
+            isinstance(value, str)
+            and field.max_length is not None
+            and len(value) > field.max_length
+        ):
+            raise ValueError(
+                f"{field_name} is longer than {field.max_length} characters"
+            )
+
+
 # load_dotenv()
 def get_feed_full_url(api_key: Union[str, None], feed_url: Union[str, None]):
 
@@ -112,9 +169,208 @@ def parse_bool(val):
     return None
 
 
+class HostLimiter:
+    """
+    Caps how many requests may be in flight to the same host at once, so a
+    concurrent sync doesn't hammer a single agency's server.
+    """
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                host, threading.BoundedSemaphore(self.per_host)
+            )
+        with semaphore:
+            yield
+
+
+def inject_dashboard_id(feature: dict[str, Any], index: int):
+    """Copies a feature's top-level ID into its properties (as ``ID_for_dashboard``), for use by the maps. Called on each feature as it's parsed."""
+    if "properties" not in feature or not isinstance(feature["properties"], dict):
+        feature["properties"] = {}
+
+    original_id = feature.get("id")
+
+    if original_id is not None:
+        # Forces uniqueness by appending the index (e.g., "XYZ-123_0", "XYZ-123_1")
+        feature["properties"]["ID_for_dashboard"] = f"{original_id}_{index}"
+
+
+def empty_feed_data_result() -> FeedDataResult:
+    return {
+        "response_code": 0,
+        "feed_data": dict(),
+        "error": None,
+        "not_modified": False,
+        "etag": "",
+        "last_modified": "",
+        "content_hash": "",
+    }
+
+
+def fetch_feed_data(
+    feed_name: str,
+    feed_data_url: str,
+    api_key: Optional[str],
+    host_limiter: HostLimiter,
+    etag: str = "",
+    last_modified: str = "",
+    max_payload_size: Optional[int] = None,
+) -> FeedDataResult:
+    """
+    Requests a feed's data from its URL. Safe to run from a worker thread, as it doesn't touch the database.
+
+    If validators from the last download are given, the request is made conditional, and a 304 response is reported as ``not_modified`` without any feed data.
+
+    The body is parsed as it streams in, and the download is abandoned once it's over ``max_payload_size`` bytes.
+    """
+
+    result = empty_feed_data_result()
+
+    if feed_name == "mdot_4":
+        header = {"api_key": api_key}
+    elif feed_name == "massdot__cwz":
+        header = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+    else:
+        header = {}
+
+    if etag:
+        header["If-None-Match"] = etag
+    if last_modified:
+        header["If-Modified-Since"] = last_modified
+
+    try:
+        with (
+            host_limiter.limit(feed_data_url),
+            requests.get(
+                feed_data_url,
+                headers=header,
+                timeout=60,
+                verify=feed_name in ["mdot_4", "massdot__cwz"],
+                stream=True,
+            ) as feed_data_request,
+        ):
+            if feed_data_request.status_code == requests.codes.not_modified:
+                result["response_code"] = requests.codes.ok
+                result["not_modified"] = True
+                return result
+
+            result["response_code"] = feed_data_request.status_code
+            if feed_data_request.status_code != requests.codes.ok:
+                result["error"] = (
+                    f"Feed {feed_name} returned invalid request status code ({feed_data_request.status_code}): {feed_data_request.url}"
+                )
+                return result
+
+            content_length = int(feed_data_request.headers.get("Content-Length") or 0)
+            if max_payload_size is not None and content_length > max_payload_size:
+                raise PayloadTooLargeError(
+                    f"Content-Length of {content_length} bytes is larger than the maximum of {max_payload_size} bytes"
+                )
+
+            # Parse the body as it downloads, injecting IDs into each feature on the way
+            feed_data = load_feed_json(
+                LimitedReader(
+                    feed_data_request.iter_content(chunk_size=STREAM_CHUNK_SIZE),
+                    max_payload_size,
+                ),
+                on_feature=inject_dashboard_id,
+            )
+
+            etag = feed_data_request.headers.get("ETag", "")
+            last_modified = feed_data_request.headers.get("Last-Modified", "")
+    except requests.exceptions.RequestException as e:
+        result["error"] = f"Feed {feed_name} request failed: {e}"
+        return result
+    except PayloadTooLargeError as e:
+        result["error"] = f"Feed {feed_name} was too large to be stored: {e}"
+        return result
+    except ValueError:
+        result["error"] = f"Feed {feed_name} was unable to be converted to JSON."
+        return result
+
+    if feed_name == "mdot_4":
+        feed_data = feed_data[0] if isinstance(feed_data, list) and feed_data else {}
+
+    result["feed_data"] = feed_data
+    result["content_hash"] = get_content_hash(feed_data)
+
+    # Only keep validators for payloads that were successfully stored
+    result["etag"] = etag
+    result["last_modified"] = last_modified
+
+    return result
+
+
 class Command(BaseCommand):
     help = "Syncs every entry in Feed with the current feeds on https://data.transportation.gov/d/69qe-yiui/"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Maximum number of feeds to request at once (default: 16).",
+        )
+        parser.add_argument(
+            "--per-host",
+            type=int,
+            default=2,
+            help="Maximum number of concurrent requests to a single host (default: 2).",
+        )
+        parser.add_argument(
+            "--max-payload-size",
+            type=int,
+            default=256,
+            help="Largest feed payload to download, in megabytes (default: 256).",
+        )
+
+    def save_feed_data(self, feed: Feed, result: FeedDataResult):
+        """Writes the result of :func:`fetch_feed_data` to the feed's :model:`dashboard.FeedData`."""
+
+        if result["error"] is not None:
+            self.stdout.write(
+                self.style.ERROR(result["error"])
+                if result["response_code"] == requests.codes.ok
+                else self.style.HTTP_BAD_REQUEST(result["error"])
+            )
+
+        if result["not_modified"]:
+            # Keep the stored feed data as is, and only mark it as checked
+            self.stdout.write(f"Feed {feed.feedname} has not changed.")
+            FeedData.objects.filter(feed=feed).update(
+                last_checked=datetime.now(tz=timezone.utc)
+            )
+            # Events are only refreshed when feed data changes, so a feed that hasn't changed since before they were stored has none yet
+            if not feed.events.exists():  # type: ignore
+                WorkZoneEvent.refresh(feed, feed.feed_data())
+            return
+
+        FeedData(
+            feed=feed,
+            response_code=result["response_code"],
+            feed_data=result["feed_data"],
+            etag=result["etag"],
+            last_modified=result["last_modified"],
+            content_hash=result["content_hash"],
+        ).save()
+
+        # Collect everything checks and views need from the new data in one pass
+        if result["feed_data"]:
+            feed.update_feed_summary(result["feed_data"], result["content_hash"])
+
+        WorkZoneEvent.refresh(feed, result["feed_data"])
+
     def handle(self, *args, **options):
         if os.environ.get("DATAHUB_APP_TOKEN") is None:
             self.stdout.write(self.style.WARNING("No app token found for DataHub."))
@@ -142,22 +398,25 @@ def handle(self, *args, **options):
                 )
             )
 
-        feeds_prior = [feed.feedname for feed in Feed.objects.all()]
+        # Load the current registry up front, and diff DataHub's list against it in memory
+        feeds_prior = set(Feed.objects.values_list("feedname", flat=True))
+        api_keys: dict[str, str] = dict(APIKey.objects.values_list("feed", "key"))
+
+        feeds_requested: dict[str, tuple[Feed, Optional[str], Optional[str]]] = {}
+        api_keys_to_save: dict[str, APIKey] = {}
         datahub_json: list[DataHubResponse] = datahub_request.json()
         for feed_requested in datahub_json:
             self.stdout.write("looking for " + str(feed_requested.get("feedname")))
-            try:
-                feed = Feed.objects.get(pk=feed_requested.get("feedname"))
-            except Feed.DoesNotExist:
-                if feed_requested.get("feedname") is None:
-                    raise CommandError("Could not find feedname.")
-                else:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"New feed {feed_requested.get('feedname')} found!"
-                        )
+            if feed_requested.get("feedname") is None:
+                raise CommandError("Could not find feedname.")
+            elif feed_requested.get("feedname") not in feeds_prior:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"New feed {feed_requested.get('feedname')} found!"
                     )
-                    feed = Feed()
+                )
+
+            feed = Feed()
             try:
                 state = feed_requested.get("state")
                 if state is not None and state in us_states.STATES_NORMALIZED.keys():
@@ -245,7 +504,7 @@ def handle(self, *args, **options):
                     and feed_requested.get("geocoded_column").get("coordinates")
                     else None
                 )
-                api_key = get_api_key(feed_requested.get("feedname"))
+                api_key = get_api_key(feed_requested.get("feedname"), api_keys)
                 if feed_requested.get("needapikey") and "url" in feed_requested:
                     if feed.feedname in ["mdot_4", "massdot__cwz"]:
                         feed_data_url = feed_requested.get("url", {}).get("url", None)
@@ -257,7 +516,7 @@ def handle(self, *args, **options):
                 else:
                     feed_data_url = feed_requested.get("url", {}).get("url", None)
 
-                feed.save()
+                check_registry_fields(feed)
             except Exception as e:
                 self.stdout.write(
                     self.style.WARNING(
@@ -267,123 +526,85 @@ def handle(self, *args, **options):
                 # optional: log stack trace using traceback module
                 continue
 
-            try:
-                feed_data_model = feed.feeddata  # type: ignore
-            except ObjectDoesNotExist:
-                feed_data_model = FeedData(feed=feed)
-
-            request_status = 0
-            feed_data = dict()
-
-            if feed_data_url is not None:
-                try:
-                    if feed.feedname == "mdot_4":
-                        header = {"api_key": api_key[1]}
-                        feed_data_request = requests.get(feed_data_url, headers=header)
-                    elif feed.feedname == "massdot__cwz":
-                        header = {
-                            "accept": "application/json",
-                            "Authorization": f"Bearer {api_key[1]}",
-                        }
-                        feed_data_request = requests.get(
-                            feed_data_url, headers=header, timeout=60
-                        )
-                    else:
-                        feed_data_request = requests.get(
-                            feed_data_url, timeout=60, verify=False
-                        )
-                except requests.exceptions.RequestException as e:
-                    self.stdout.write(
-                        self.style.HTTP_BAD_REQUEST(
-                            f"Feed {feed_requested.get('feedname')} request failed: {e}"
-                        )
-                    )
-                else:
-                    request_status = feed_data_request.status_code
-                    if feed_data_request.status_code != requests.codes.ok:
-                        self.stdout.write(
-                            self.style.HTTP_BAD_REQUEST(
-                                f"Feed {feed_requested.get('feedname')} returned invalid request status code ({feed_data_request.status_code}): {feed_data_request.url}"
-                            )
-                        )
-                    else:
-                        try:
-                            feed_data = feed_data_request.json()
-                        except ValueError:
-                            self.stdout.write(
-                                self.style.ERROR(
-                                    f"Feed {feed_requested.get('feedname')} was unable to be converted to JSON."
-                                )
-                            )
-
-            feed_data_model.response_code = request_status
-
-            # --- NEW CODE: Helper to copy top-level ID to properties ---
-            def inject_dashboard_id(geojson_data):
-                # Ensure the data is actually a GeoJSON dict with a "features" list
-                if isinstance(geojson_data, dict) and "features" in geojson_data:
-                    for index, feature in enumerate(geojson_data.get("features", [])):
-                        if "properties" not in feature or not isinstance(
-                            feature["properties"], dict
-                        ):
-                            feature["properties"] = {}
-
-                        original_id = feature.get("id")
-
-                        if original_id is not None:
-                            # Forces uniqueness by appending the index (e.g., "XYZ-123_0", "XYZ-123_1")
-                            feature["properties"][
-                                "ID_for_dashboard"
-                            ] = f"{original_id}_{index}"
-
-                return geojson_data
-
-            # -----------------------------------------------------------
-
-            if feed.feedname == "mdot_4":
-                if feed_data_request.status_code == requests.codes.ok:
-                    feed_data_model.feed_data = inject_dashboard_id(feed_data[0])
-                else:
-                    feed_data_model.feed_data = {}
-            else:
-                feed_data_model.feed_data = inject_dashboard_id(feed_data)
-
-            feed_data_model.save()
-
             if feed_requested.get("needapikey") and api_key[0] is None:
                 self.stdout.write(
                     self.style.WARNING(
                         f"No API key for {feed_requested.get('feedname')} found in database."
                     )
                 )
-                APIKey.objects.create(feed=feed, key=(api_key[1] or ""))
+                api_keys_to_save[feed.feedname] = APIKey(
+                    feed=feed, key=(api_key[1] or "")
+                )
             elif feed_requested.get("needapikey") and not api_key[0] and api_key[1]:
                 self.stdout.write(
                     self.style.WARNING(
                         f"No API key for {feed_requested.get('feedname')} found in database, adding from environment."
                     )
                 )
-                api_key_object = APIKey.objects.get(feed=feed)
-                api_key_object.key = api_key[1]
-                api_key_object.save()
+                api_keys_to_save[feed.feedname] = APIKey(feed=feed, key=api_key[1])
 
-            try:
-                feeds_prior.remove(feed_requested.get("feedname"))
-            except ValueError:
-                pass
+            # A feed listed twice keeps its last entry, as when each was saved in turn
+            feeds_requested[feed.feedname] = (feed, feed_data_url, api_key[1])
 
-        # Remove all feeds not updated
-        for feed_not_found in feeds_prior:
-            try:
-                feed_to_delete = Feed.objects.get(pk=feed_not_found)
-            except Feed.DoesNotExist:
-                raise CommandError(
-                    f"Tried to delete feed {feed_not_found} that does not exist"
-                )
+        feeds_to_fetch = list(feeds_requested.values())
+
+        # Insert new feeds and update existing ones in one statement. Only the
+        # fields DataHub provides are written, so stored statuses are kept.
+        Feed.objects.bulk_create(
+            [feed for (feed, _, _) in feeds_to_fetch],
+            update_conflicts=True,
+            unique_fields=["feedname"],
+            update_fields=REGISTRY_FIELDS,
+        )
+        APIKey.objects.bulk_create(
+            api_keys_to_save.values(),
+            update_conflicts=True,
+            unique_fields=["feed"],
+            update_fields=["key"],
+        )
+
+        # Validators from the last successful download, for conditional requests
+        validators = {
+            feed_pk: (etag, last_modified)
+            for (feed_pk, etag, last_modified) in FeedData.objects.filter(
+                response_code=requests.codes.ok
+            ).values_list("feed", "etag", "last_modified")
+        }
+
+        # Fetch feed data concurrently, but write it back from this thread only
+        host_limiter = HostLimiter(options["per_host"])
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            pending_fetches = {
+                executor.submit(
+                    fetch_feed_data,
+                    feed.feedname,
+                    feed_data_url,
+                    api_key,
+                    host_limiter,
+                    *validators.get(feed.pk, ("", "")),
+                    options["max_payload_size"] * 1024 * 1024,
+                ): feed
+                for (feed, feed_data_url, api_key) in feeds_to_fetch
+                if feed_data_url is not None
+            }
+
+            for feed, feed_data_url, _ in feeds_to_fetch:
+                if feed_data_url is None:
+                    self.save_feed_data(feed, empty_feed_data_result())
+
+            for future in as_completed(pending_fetches):
+                self.save_feed_data(pending_fetches[future], future.result())
 
-            feed_to_delete.delete()
+        # Remove all feeds not updated
+        feeds_not_found = sorted(feeds_prior - feeds_requested.keys())
+        Feed.objects.filter(feedname__in=feeds_not_found).delete()
+        for feed_not_found in feeds_not_found:
             self.stdout.write(self.style.WARNING(f"Feed {feed_not_found} deleted."))
 
+        # The feeds map's clusters are of feeds' points, so they're rebuilt with added, moved and deleted feeds
+        count = FeedPointCluster.rebuild()
+        self.stdout.write(f"Rebuilt {count} feed point clusters.")
+
         self.stdout.write(
             self.style.SUCCESS("Successfully synced feed list with DataHub!")
         )
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0029_alter_feed_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feeddata",
+            name="etag",
+            field=models.CharField(
+                blank=True, default="", max_length=255, verbose_name="ETag"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feeddata",
+            name="last_modified",
+            field=models.CharField(
+                blank=True, default="", max_length=255, verbose_name="Last Modified"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0030_feeddata_etag_feeddata_last_modified"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SchemaCheck",
+            fields=[
+                (
+                    "feed",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="dashboard.feed",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(max_length=64, verbose_name="Feed Data Hash"),
+                ),
+                ("version", models.CharField(max_length=150, verbose_name="Version")),
+                ("datetime_checked", models.DateTimeField(auto_now=True)),
+                (
+                    "most_common_type",
+                    models.TextField(
+                        blank=True, verbose_name="Most Common Schema Error Type"
+                    ),
+                ),
+                (
+                    "most_common_field",
+                    models.TextField(
+                        blank=True, verbose_name="Most Common Schema Error Field"
+                    ),
+                ),
+                (
+                    "most_common_count",
+                    models.IntegerField(
+                        default=0, verbose_name="Occurences of Most Common Error"
+                    ),
+                ),
+                (
+                    "total_errors",
+                    models.IntegerField(default=0, verbose_name="Total Schema Errors"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="feeddata",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, default="", max_length=64, verbose_name="Feed Data Hash"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0031_schemacheck_feeddata_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schemacheck",
+            name="feature_errors",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Schema Errors by Feature"
+            ),
+        ),
+    ]
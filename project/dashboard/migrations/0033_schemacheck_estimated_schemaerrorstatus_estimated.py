@@ -0,0 +1,27 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0032_schemacheck_feature_errors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schemacheck",
+            name="estimated",
+            field=models.BooleanField(
+                default=False, verbose_name="Error Counts Estimated"
+            ),
+        ),
+        migrations.AddField(
+            model_name="schemaerrorstatus",
+            name="estimated",
+            field=models.BooleanField(
+                default=False, verbose_name="Error Counts Estimated"
+            ),
+        ),
+    ]
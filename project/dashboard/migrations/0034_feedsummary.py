@@ -0,0 +1,63 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0033_schemacheck_estimated_schemaerrorstatus_estimated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedSummary",
+            fields=[
+                (
+                    "feed",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="dashboard.feed",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(max_length=64, verbose_name="Feed Data Hash"),
+                ),
+                ("version", models.CharField(max_length=150, verbose_name="Version")),
+                ("datetime_analyzed", models.DateTimeField(auto_now=True)),
+                (
+                    "latest_update_date",
+                    models.DateTimeField(null=True, verbose_name="Latest Update Date"),
+                ),
+                (
+                    "end_dates",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="End Dates"
+                    ),
+                ),
+                (
+                    "event_type_counts",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Events by Type"
+                    ),
+                ),
+                (
+                    "feature_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Features"),
+                ),
+                (
+                    "work_zone_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Work Zone Events"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "feed summaries",
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+def copy_latest_statuses(apps, schema_editor):
+    """Status details need the status subclasses' methods, so they're filled in by the next checkfeeds run."""
+    Feed = apps.get_model("dashboard", "Feed")
+    FeedStatus = apps.get_model("dashboard", "FeedStatus")
+
+    for feed in Feed.objects.all():
+        latest_status = (
+            FeedStatus.objects.filter(feed=feed).order_by("-datetime_checked").first()
+        )
+        if latest_status is not None:
+            feed.status_type = latest_status.status_type
+            feed.status_since = latest_status.status_since
+            feed.save(update_fields=["status_type", "status_since"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0034_feedsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="status_details",
+            field=models.TextField(
+                blank=True, default="", verbose_name="Detailed Status"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="status_since",
+            field=models.DateTimeField(null=True, verbose_name="Status Since"),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="status_type",
+            field=models.CharField(
+                choices=[
+                    ("NA", "null"),
+                    ("OK", "ok"),
+                    ("ER", "error"),
+                    ("OU", "outdated"),
+                    ("ST", "stale"),
+                    ("OF", "offline"),
+                ],
+                default="NA",
+                max_length=2,
+                verbose_name="Status",
+            ),
+        ),
+        migrations.RunPython(copy_latest_statuses, migrations.RunPython.noop),
+    ]
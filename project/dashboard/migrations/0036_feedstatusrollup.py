@@ -0,0 +1,64 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0035_feed_status_type_feed_status_since_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedStatusRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Date")),
+                (
+                    "status_type",
+                    models.CharField(
+                        choices=[
+                            ("NA", "null"),
+                            ("OK", "ok"),
+                            ("ER", "error"),
+                            ("OU", "outdated"),
+                            ("ST", "stale"),
+                            ("OF", "offline"),
+                        ],
+                        default="NA",
+                        max_length=2,
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="Statuses"),
+                ),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="dashboard.feed"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "feed status rollups",
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("feed", "date", "status_type"),
+                        name="unique_feed_status_rollup",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:34
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# Fields that make up each status type's details
+DETAIL_FIELDS = {
+    "SchemaErrorStatus": [
+        "most_common_type",
+        "most_common_field",
+        "most_common_count",
+        "total_errors",
+        "estimated",
+    ],
+    "OutdatedErrorStatus": ["update_date"],
+    "StaleErrorStatus": ["latest_end_date", "amount_events_before_end_date"],
+}
+
+DELETE_BATCH_SIZE = 500
+
+
+def rebuild_rollups(apps, schema_editor):
+    """Same as manage.py backfillrollups, while every status is still a single check."""
+    FeedStatus = apps.get_model("dashboard", "FeedStatus")
+    FeedStatusRollup = apps.get_model("dashboard", "FeedStatusRollup")
+
+    daily_counts = (
+        FeedStatus.objects.annotate(date=TruncDate("datetime_checked"))
+        .values("feed", "date", "status_type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+    FeedStatusRollup.objects.all().delete()
+    FeedStatusRollup.objects.bulk_create(
+        (
+            FeedStatusRollup(
+                feed_id=daily_count["feed"],
+                date=daily_count["date"],
+                status_type=daily_count["status_type"],
+                count=daily_count["count"],
+            )
+            for daily_count in daily_counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+def compact_statuses(apps, schema_editor):
+    """Merges each run of consecutive statuses with the same type and details into its first status."""
+    Feed = apps.get_model("dashboard", "Feed")
+    FeedStatus = apps.get_model("dashboard", "FeedStatus")
+
+    for feed in Feed.objects.all():
+        details = {}
+        for model_name, fields in DETAIL_FIELDS.items():
+            model = apps.get_model("dashboard", model_name)
+            for pk, *values in model.objects.filter(feed=feed).values_list(
+                "pk", *fields
+            ):
+                details[pk] = tuple(values)
+
+        statuses = (
+            FeedStatus.objects.filter(feed=feed)
+            .order_by("datetime_checked")
+            .values_list("pk", "status_type", "datetime_checked")
+        )
+
+        merged_pks = []
+        interval_pk, interval_key, last_checked, check_count = None, None, None, 0
+
+        def close_interval():
+            if interval_pk is not None:
+                FeedStatus.objects.filter(pk=interval_pk).update(
+                    last_checked=last_checked, check_count=check_count
+                )
+
+        for pk, status_type, datetime_checked in statuses.iterator():
+            key = (status_type, details.get(pk))
+            if interval_pk is not None and key == interval_key:
+                merged_pks.append(pk)
+                last_checked = datetime_checked
+                check_count += 1
+            else:
+                close_interval()
+                interval_pk, interval_key = pk, key
+                last_checked, check_count = datetime_checked, 1
+
+        close_interval()
+
+        for start in range(0, len(merged_pks), DELETE_BATCH_SIZE):
+            end = start + DELETE_BATCH_SIZE
+            FeedStatus.objects.filter(pk__in=merged_pks[start:end]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0036_feedstatusrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedstatus",
+            name="check_count",
+            field=models.PositiveIntegerField(default=1, verbose_name="Checks"),
+        ),
+        migrations.AddField(
+            model_name="feedstatus",
+            name="last_checked",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="Last Checked"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="feedstatus",
+            name="status_since",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.RunPython(compact_statuses, migrations.RunPython.noop),
+    ]
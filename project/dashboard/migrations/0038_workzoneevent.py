@@ -0,0 +1,96 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:49
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0037_feedstatus_intervals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkZoneEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "feature_hash",
+                    models.CharField(max_length=64, verbose_name="Feature Hash"),
+                ),
+                ("position", models.PositiveIntegerField(verbose_name="Position")),
+                (
+                    "event_id",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Event ID"
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        blank=True, max_length=150, verbose_name="Event Type"
+                    ),
+                ),
+                (
+                    "road_names",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Road Names"
+                    ),
+                ),
+                (
+                    "direction",
+                    models.CharField(
+                        blank=True, max_length=150, verbose_name="Direction"
+                    ),
+                ),
+                (
+                    "start_date",
+                    models.DateTimeField(null=True, verbose_name="Start Date"),
+                ),
+                ("end_date", models.DateTimeField(null=True, verbose_name="End Date")),
+                (
+                    "geometry",
+                    django.contrib.gis.db.models.fields.GeometryField(
+                        null=True, srid=4326, verbose_name="Geometry"
+                    ),
+                ),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="dashboard.feed",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "work zone events",
+                "ordering": ["feed", "position"],
+                "indexes": [
+                    models.Index(
+                        fields=["event_type", "end_date"],
+                        name="dashboard_w_event_t_ae476c_idx",
+                    ),
+                    models.Index(
+                        fields=["feed", "event_type"],
+                        name="dashboard_w_feed_id_0f9f27_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("feed", "feature_hash"), name="unique_work_zone_event"
+                    )
+                ],
+            },
+        ),
+    ]
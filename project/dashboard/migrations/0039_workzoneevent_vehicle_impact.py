@@ -0,0 +1,20 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0038_workzoneevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workzoneevent",
+            name="vehicle_impact",
+            field=models.CharField(
+                blank=True, max_length=150, verbose_name="Vehicle Impact"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.13 on 2026-10-18 07:55
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0039_workzoneevent_vehicle_impact"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedPointCluster",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("zoom", models.PositiveSmallIntegerField(verbose_name="Zoom")),
+                ("cell_x", models.PositiveIntegerField(verbose_name="Cell X")),
+                ("cell_y", models.PositiveIntegerField(verbose_name="Cell Y")),
+                (
+                    "point",
+                    django.contrib.gis.db.models.fields.PointField(
+                        srid=4326, verbose_name="Point"
+                    ),
+                ),
+                ("feed_count", models.PositiveIntegerField(verbose_name="Feeds")),
+                (
+                    "status_counts",
+                    models.JSONField(default=dict, verbose_name="Status Counts"),
+                ),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="dashboard.feed",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "feed point clusters",
+                "ordering": ["zoom", "cell_y", "cell_x"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("zoom", "cell_x", "cell_y"),
+                        name="unique_feed_point_cluster",
+                    )
+                ],
+            },
+        ),
+    ]
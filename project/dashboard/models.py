@@ -1,15 +1,45 @@
+import json
+import math
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from typing import Iterable
+
 import requests
 from django.contrib.gis.db import models
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Point
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Value
+from django.db import transaction
+from django.db.models import F, Sum, Value
 from django.db.models.functions import NullIf
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from localflavor.us import models as us_models, us_states
+from shared.feed_analysis import analyze_feed, get_event_details
+from shared.schema_check import get_content_hash, get_feature_hash
 
 # Create your models here.
 
 
+class StatusType(models.TextChoices):
+    NULL = "NA", ("null")
+    OK = "OK", _("ok")
+    ERROR = "ER", _("error")
+    OUTDATED = "OU", _("outdated")
+    STALE = "ST", _("stale")
+    OFFLINE = "OF", _("offline")
+
+
+ERROR_STATUS_TYPES = {
+    StatusType.ERROR,
+    StatusType.OUTDATED,
+    StatusType.STALE,
+    StatusType.OFFLINE,
+}
+
+
 class Feed(models.Model):
     """
     A model representing the information available at https://data.transportation.gov/d/69qe-yiui/.
@@ -65,6 +95,16 @@ class Feed(models.Model):
         null=True,
     )
 
+    # Copy of the latest :model:`dashboard.FeedStatus`, written along with it by checkfeeds, so feed lists don't need a status query per feed
+    status_type = models.CharField(
+        _("Status"),
+        max_length=2,
+        choices=StatusType.choices,
+        default=StatusType.NULL,
+    )
+    status_since = models.DateTimeField(_("Status Since"), null=True)
+    status_details = models.TextField(_("Detailed Status"), blank=True, default="")
+
     class Meta:
         ordering = [NullIf("state", Value("")).asc(nulls_last=True), "feedname"]
         verbose_name_plural = _("feeds")
@@ -74,42 +114,13 @@ def __str__(self):
 
     def work_zone_events(self):
         """
-        Returns all features that are classified as work zones (if feed status is OK).
+        Returns all events that are classified as work zones (if feed status is OK), from :model:`dashboard.WorkZoneEvent`.
         """
 
-        feed_status = self.feed_status()
-        if feed_status is None or feed_status.status_type != FeedStatus.StatusType.OK:
-            return []
-
-        feed_data = self.feed_data() or {}
-
-        if not feed_data:
-            return []
-
-        features = feed_data.get("features", [])
-
-        if not features:
-            return features
+        if self.status_type != StatusType.OK:
+            return WorkZoneEvent.objects.none()
 
-        if self.version.startswith("3"):
-            events = [
-                feature
-                for feature in features
-                if feature.get("properties", {}).get("event_type", "") == "work-zone"
-            ]
-        elif self.version.startswith("4"):
-            events = [
-                feature
-                for feature in features
-                if feature.get("properties", {})
-                .get("core_details", {})
-                .get("event_type", "")
-                == "work-zone"
-            ]
-        else:
-            events = []
-
-        return events
+        return self.events.filter(event_type="work-zone")  # type: ignore
 
     def feed_status(self):
         """
@@ -137,11 +148,57 @@ def feed_status(self):
 
         return None
 
-    def status_type(self):
-        feed_status = self.feed_status()
+    def is_error(self):
+        return self.status_type in ERROR_STATUS_TYPES
+
+    def copy_status(self, feed_status: "FeedStatus", details: str):
+        """Copies a new :model:`dashboard.FeedStatus` (and its details) onto the feed. Doesn't save the feed."""
 
-        if feed_status:
-            return feed_status.status_type
+        self.status_type = feed_status.status_type
+        self.status_since = feed_status.status_since
+        self.status_details = details
+
+    def feed_summary(self):
+        """
+        Returns the :model:`dashboard.FeedSummary` of the current feed data, analyzing it first if there isn't one yet.
+        """
+        try:
+            feed_data = self.feeddata  # type: ignore
+        except ObjectDoesNotExist:
+            return None
+
+        try:
+            feed_summary = self.feedsummary  # type: ignore
+        except ObjectDoesNotExist:
+            feed_summary = None
+
+        if (
+            feed_summary is not None
+            and feed_data.content_hash
+            and feed_summary.content_hash == feed_data.content_hash
+            and feed_summary.version == self.version
+        ):
+            return feed_summary
+
+        return self.update_feed_summary(feed_data.feed_data, feed_data.content_hash)
+
+    def update_feed_summary(self, feed_data, content_hash: str):
+        """Analyzes feed data (see :func:`shared.feed_analysis.analyze_feed`) and stores the result."""
+
+        analysis = analyze_feed(feed_data, self.version)
+
+        feed_summary, _ = FeedSummary.objects.update_or_create(
+            feed=self,
+            defaults={
+                "content_hash": content_hash,
+                "version": self.version,
+                **analysis,
+                "end_dates": [
+                    end_date.isoformat() for end_date in analysis["end_dates"]
+                ],
+            },
+        )
+        return feed_summary
 
     def feed_data(self):
         try:
@@ -195,18 +252,313 @@ class FeedData(models.Model):
         _("Feed Data"),
         default=dict,
     )
+    content_hash = models.CharField(
+        _("Feed Data Hash"), blank=True, default="", max_length=64
+    )
+    # Cache validators from the feed's last successful response, for conditional requests
+    etag = models.CharField(_("ETag"), blank=True, default="", max_length=255)
+    last_modified = models.CharField(
+        _("Last Modified"), blank=True, default="", max_length=255
+    )
+
+
+class FeedSummary(models.Model):
+    """
+    Facts about a feed's :model:`dashboard.FeedData`, collected in a single pass when it's ingested, so status checks and views don't have to scan the JSON again.
+    """
+
+    feed = models.OneToOneField(
+        Feed,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    content_hash = models.CharField(_("Feed Data Hash"), max_length=64)
+    version = models.CharField(_("Version"), max_length=150)
+    datetime_analyzed = models.DateTimeField(auto_now=True)
+
+    latest_update_date = models.DateTimeField(_("Latest Update Date"), null=True)
+    # ISO 8601 strings, oldest first
+    end_dates = models.JSONField(_("End Dates"), default=list, blank=True)
+    event_type_counts = models.JSONField(_("Events by Type"), default=dict, blank=True)
+    feature_count = models.PositiveIntegerField(_("Features"), default=0)
+    work_zone_count = models.PositiveIntegerField(_("Work Zone Events"), default=0)
+
+    class Meta:
+        verbose_name_plural = _("feed summaries")
+
+    def __str__(self):
+        return f"{self.feed.feedname}: {self.feature_count} features ({self.content_hash[:8]})"
+
+    def end_dates_before(self, date: datetime) -> list[datetime]:
+        """All end dates before date, oldest first."""
+        end_dates = [datetime.fromisoformat(end_date) for end_date in self.end_dates]
+        return end_dates[: bisect_left(end_dates, date)]
+
+
+class WorkZoneEvent(models.Model):
+    """
+    A feature of a feed's :model:`dashboard.FeedData`, with the fields event queries filter on extracted into indexed columns. Refreshed by syncdatahub whenever a feed's data changes (rebuilt with management command refreshevents).
+    """
+
+    feed = models.ForeignKey(
+        Feed,
+        on_delete=models.CASCADE,
+        related_name="events",
+    )
+    # Hash of the feature (see :func:`shared.schema_check.get_feature_hash`) and the feed version it was read with, to tell which rows a new payload changes
+    feature_hash = models.CharField(_("Feature Hash"), max_length=64)
+    # Index of the raw feature in the feed data's features
+    position = models.PositiveIntegerField(_("Position"))
+
+    event_id = models.CharField(_("Event ID"), blank=True, max_length=255)
+    event_type = models.CharField(_("Event Type"), blank=True, max_length=150)
+    road_names = models.JSONField(_("Road Names"), default=list, blank=True)
+    direction = models.CharField(_("Direction"), blank=True, max_length=150)
+    start_date = models.DateTimeField(_("Start Date"), null=True)
+    end_date = models.DateTimeField(_("End Date"), null=True)
+    vehicle_impact = models.CharField(_("Vehicle Impact"), blank=True, max_length=150)
+    geometry = models.GeometryField(_("Geometry"), null=True)
+
+    class Meta:
+        ordering = ["feed", "position"]
+        verbose_name_plural = _("work zone events")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["feed", "feature_hash"],
+                name="unique_work_zone_event",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["event_type", "end_date"]),
+            models.Index(fields=["feed", "event_type"]),
+        ]
+
+    def __str__(self):
+        return f"{self.feed_id} {self.event_type} {self.event_id}"
+
+    def feature(self):
+        """The raw feature from the feed data."""
+        features = (self.feed.feed_data() or {}).get("features") or []
+        return features[self.position] if self.position < len(features) else None
+
+    @classmethod
+    def from_feature(
+        cls, feed: Feed, feature, feature_hash: str, position: int
+    ) -> "WorkZoneEvent":
+        details = get_event_details(feature, feed.version)
+
+        geometry = None
+        if details["geometry"] is not None:
+            try:
+                geometry = GEOSGeometry(json.dumps(details["geometry"]), srid=4326)
+            except (GDALException, GEOSException, ValueError):
+                geometry = None
+
+        return cls(
+            feed=feed,
+            feature_hash=feature_hash,
+            position=position,
+            event_id=details["event_id"][:255],
+            event_type=details["event_type"][:150],
+            road_names=details["road_names"],
+            direction=details["direction"][:150],
+            start_date=details["start_date"],
+            end_date=details["end_date"],
+            vehicle_impact=details["vehicle_impact"][:150],
+            geometry=geometry,
+        )
+
+    @classmethod
+    def refresh(cls, feed: Feed, feed_data) -> int:
+        """
+        Brings the feed's events in line with its feed data. Only features that were added or changed are read and inserted, and the rest are kept (with their position updated if it moved). Returns the number of events inserted.
+        """
+
+        features = feed_data.get("features") if isinstance(feed_data, dict) else None
+        if not isinstance(features, list):
+            features = []
+
+        existing = {
+            feature_hash: (pk, position)
+            for pk, feature_hash, position in cls.objects.filter(feed=feed).values_list(
+                "pk", "feature_hash", "position"
+            )
+        }
+
+        new_events: list[WorkZoneEvent] = []
+        moved_events: list[WorkZoneEvent] = []
+        kept: set[str] = set()
+        for position, feature in enumerate(features):
+            feature_hash = get_content_hash([feed.version, get_feature_hash(feature)])
+            if feature_hash in kept:
+                # Identical features are only stored once
+                continue
+            kept.add(feature_hash)
+
+            if feature_hash not in existing:
+                new_events.append(
+                    cls.from_feature(feed, feature, feature_hash, position)
+                )
+            elif existing[feature_hash][1] != position:
+                moved_events.append(
+                    cls(pk=existing[feature_hash][0], position=position)
+                )
+
+        cls.objects.filter(
+            pk__in=[
+                pk
+                for feature_hash, (pk, _) in existing.items()
+                if feature_hash not in kept
+            ]
+        ).delete()
+        cls.objects.bulk_update(moved_events, ["position"], batch_size=500)
+        cls.objects.bulk_create(new_events, batch_size=500)
+
+        return len(new_events)
+
+
+# Feed points are clustered up to this zoom level, and served individually past it
+MAX_CLUSTER_ZOOM = 10
+# Width of a cluster's grid cell, in pixels of 256 pixel map tiles
+CLUSTER_CELL_SIZE = 64
+# Web mercator stops short of the poles
+MAX_LATITUDE = 85.0511287798
+
+
+def get_grid_cell(point: Point, zoom: int) -> tuple[int, int]:
+    """The cluster grid cell a longitude/latitude point falls in, at a zoom level."""
+
+    latitude = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, point.y)))
+    x = (point.x + 180) / 360
+    y = (1 - math.asinh(math.tan(latitude)) / math.pi) / 2
+
+    cells = 2**zoom * 256 // CLUSTER_CELL_SIZE
+    return (
+        min(cells - 1, max(0, math.floor(x * cells))),
+        min(cells - 1, max(0, math.floor(y * cells))),
+    )
+
+
+class FeedPointCluster(models.Model):
+    """
+    Feeds' :model:`dashboard.Feed` points grouped on a grid for each zoom level, with the number of feeds of each status in the group. Rebuilt by checkfeeds and syncdatahub after every run, so the feeds map doesn't need every feed at every zoom.
+    """
+
+    zoom = models.PositiveSmallIntegerField(_("Zoom"))
+    cell_x = models.PositiveIntegerField(_("Cell X"))
+    cell_y = models.PositiveIntegerField(_("Cell Y"))
+    # Average of the feeds' points
+    point = models.PointField(_("Point"))
+    feed_count = models.PositiveIntegerField(_("Feeds"))
+    status_counts = models.JSONField(_("Status Counts"), default=dict)
+    # Set if the cluster is a single feed, which is then shown as it is
+    feed = models.ForeignKey(
+        Feed,
+        on_delete=models.CASCADE,
+        null=True,
+    )
+
+    class Meta:
+        ordering = ["zoom", "cell_y", "cell_x"]
+        verbose_name_plural = _("feed point clusters")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["zoom", "cell_x", "cell_y"],
+                name="unique_feed_point_cluster",
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"Zoom {self.zoom} ({self.cell_x}, {self.cell_y}): {self.feed_count} feeds"
+        )
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Clusters every feed's point at each zoom level up to MAX_CLUSTER_ZOOM, replacing the previous clusters. Returns the number of clusters."""
+
+        feeds = list(
+            Feed.objects.filter(geocoded_column__isnull=False)
+            .only("feedname", "status_type", "geocoded_column")
+            .order_by("feedname")
+        )
+
+        clusters: list[FeedPointCluster] = []
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            cells: dict[tuple[int, int], list[Feed]] = {}
+            for feed in feeds:
+                cell = get_grid_cell(feed.geocoded_column, zoom)
+                cells.setdefault(cell, []).append(feed)
+
+            for (cell_x, cell_y), cell_feeds in cells.items():
+                clusters.append(
+                    cls(
+                        zoom=zoom,
+                        cell_x=cell_x,
+                        cell_y=cell_y,
+                        point=Point(
+                            sum(feed.geocoded_column.x for feed in cell_feeds)
+                            / len(cell_feeds),
+                            sum(feed.geocoded_column.y for feed in cell_feeds)
+                            / len(cell_feeds),
+                            srid=4326,
+                        ),
+                        feed_count=len(cell_feeds),
+                        status_counts=dict(
+                            Counter(feed.status_type for feed in cell_feeds)
+                        ),
+                        feed=cell_feeds[0] if len(cell_feeds) == 1 else None,
+                    )
+                )
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(clusters, batch_size=500)
+
+        return len(clusters)
+
+
+class SchemaCheck(models.Model):
+    """
+    Result of the last schema validation of a feed's :model:`dashboard.FeedData`. Reused by checkfeeds for as long as the payload hash and feed version stay the same, and per feature otherwise.
+    """
+
+    feed = models.OneToOneField(
+        Feed,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    content_hash = models.CharField(_("Feed Data Hash"), max_length=64)
+    version = models.CharField(_("Version"), max_length=150)
+    datetime_checked = models.DateTimeField(auto_now=True)
+
+    most_common_type = models.TextField(_("Most Common Schema Error Type"), blank=True)
+    most_common_field = models.TextField(
+        _("Most Common Schema Error Field"), blank=True
+    )
+    most_common_count = models.IntegerField(
+        _("Occurences of Most Common Error"), default=0
+    )
+    total_errors = models.IntegerField(_("Total Schema Errors"), default=0)
+    estimated = models.BooleanField(_("Error Counts Estimated"), default=False)
+
+    # Errors of every feature, by feature hash, so unchanged features aren't validated again
+    feature_errors = models.JSONField(
+        _("Schema Errors by Feature"), default=dict, blank=True
+    )
+
+    def __str__(self):
+        return f"{self.feed.feedname}: {self.total_errors} schema errors ({self.content_hash[:8]})"
 
 
 class FeedStatus(models.Model):
-    """Base class for status of feed in :model:`dashboard.Feed`. To be inherited by schema, outdated, stale, etc. errors."""
+    """
+    Base class for status of feed in :model:`dashboard.Feed`. To be inherited by schema, outdated, stale, etc. errors.
 
-    class StatusType(models.TextChoices):
-        NULL = "NA", ("null")
-        OK = "OK", _("ok")
-        ERROR = "ER", _("error")
-        OUTDATED = "OU", _("outdated")
-        STALE = "ST", _("stale")
-        OFFLINE = "OF", _("offline")
+    Each status is an interval: from ``datetime_checked`` to ``last_checked``, over ``check_count`` checks. Checks that don't change the status (or its details) only extend the feed's latest status.
+    """
+
+    StatusType = StatusType
 
     feed = models.ForeignKey(
         Feed,
@@ -223,7 +575,12 @@ class StatusType(models.TextChoices):
         auto_now_add=True,
     )
 
-    status_since = models.DateTimeField(auto_now_add=True)
+    # Last check in this interval
+    last_checked = models.DateTimeField(_("Last Checked"), default=timezone.now)
+    check_count = models.PositiveIntegerField(_("Checks"), default=1)
+
+    # Start of the interval with this status type, which may span several statuses (eg. with different details)
+    status_since = models.DateTimeField(default=timezone.now)
 
     notif_sent = models.BooleanField(default=False)
 
@@ -231,12 +588,7 @@ def __str__(self):
         return f"{self.feed.feedname}: {self.StatusType(self.status_type).label} {self.datetime_checked}"
 
     def is_error(self):
-        return self.status_type in {
-            self.StatusType.ERROR,
-            self.StatusType.OUTDATED,
-            self.StatusType.STALE,
-            self.StatusType.OFFLINE,
-        }
+        return self.status_type in ERROR_STATUS_TYPES
 
     def details(self):
         """Base function for feed status details. Should be overridden by subclasses."""
@@ -258,8 +610,9 @@ def __init__(self, *args, **kwargs):
 
     def details(self):
         """Returns a string with detailed status. In this case, details how many work zone events are present"""
-        events = self.feed.work_zone_events()
-        return f"All good! {len(events)} work zone events."
+        feed_summary = self.feed.feed_summary()
+        work_zone_count = feed_summary.work_zone_count if feed_summary else 0
+        return f"All good! {work_zone_count} work zone events."
 
 
 class SchemaErrorStatus(FeedStatus):
@@ -278,6 +631,8 @@ def __init__(self, *args, **kwargs):
 
     most_common_count = models.IntegerField(_("Occurences of Most Common Error"))
     total_errors = models.IntegerField(_("Total Schema Errors"))
+    # Set when only some features were validated, and counts were extrapolated from them
+    estimated = models.BooleanField(_("Error Counts Estimated"), default=False)
 
     def details(self):
         """Returns a string with detailed status. In this case, details most common error and how many are present."""
@@ -288,7 +643,7 @@ def details(self):
 
         other_errors = self.total_errors - self.most_common_count
 
-        return f"{self.most_common_count} schema error{'s' if self.most_common_count != 1 else ''} detected: {most_common_error}.{(' There ' + ('are ' if other_errors != 1 else 'is ') + str(other_errors) + ' other error' + ('s' if other_errors != 1 else '') + '.') if other_errors > 0 else ''}"
+        return f"{'About ' if self.estimated else ''}{self.most_common_count} schema error{'s' if self.most_common_count != 1 else ''} detected: {most_common_error}.{(' There ' + ('are ' if other_errors != 1 else 'is ') + ('about ' if self.estimated else '') + str(other_errors) + ' other error' + ('s' if other_errors != 1 else '') + '.') if other_errors > 0 else ''}"
 
 
 class OutdatedErrorStatus(FeedStatus):
@@ -365,6 +720,101 @@ def details(self):
         return "Feed unreachable at URL."
 
 
+class FeedStatusRollupQuerySet(models.QuerySet):
+    def status_summary(self) -> dict[str, list[tuple[str, str]]]:
+        """
+        Share of each status type (label, percentage), most common first, for each feed in the rollups.
+        """
+
+        status_counts = (
+            self.values("feed", "status_type")
+            .annotate(count=Sum("count"))
+            .order_by("feed", "-count")
+        )
+
+        feed_totals: dict[str, int] = {}
+        for status in status_counts:
+            feed_totals[status["feed"]] = (
+                feed_totals.get(status["feed"], 0) + status["count"]
+            )
+
+        status_summary: dict[str, list[tuple[str, str]]] = {}
+        for status in status_counts:
+            status_summary.setdefault(status["feed"], []).append(
+                (
+                    StatusType(status["status_type"]).label,
+                    str(round(status["count"] / feed_totals[status["feed"]] * 100, 2)),
+                )
+            )
+
+        return status_summary
+
+
+class FeedStatusRollup(models.Model):
+    """
+    Number of :model:`dashboard.FeedStatus` of each type, per feed and day. Kept up to date by checkfeeds (rebuilt with management command backfillrollups), so status history doesn't need to be counted from every status.
+    """
+
+    feed = models.ForeignKey(
+        Feed,
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField(_("Date"))
+    status_type = models.CharField(
+        max_length=2,
+        choices=StatusType.choices,
+        default=StatusType.NULL,
+    )
+    count = models.PositiveIntegerField(_("Statuses"), default=0)
+
+    objects = FeedStatusRollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-date"]
+        verbose_name_plural = _("feed status rollups")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["feed", "date", "status_type"],
+                name="unique_feed_status_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.feed.feedname}: {self.count} {StatusType(self.status_type).label} {self.date}"
+
+    @classmethod
+    def add_checks(cls, checks: Iterable[tuple[Feed, str, datetime]]):
+        """Counts checks (feed, status type, time of check) in their days' rollups, with a fixed number of queries."""
+
+        check_counts = Counter(
+            (feed.pk, timezone.localdate(datetime_checked), status_type)
+            for feed, status_type, datetime_checked in checks
+        )
+        if not check_counts:
+            return
+
+        cls.objects.bulk_create(
+            [
+                cls(feed_id=feed_pk, date=date, status_type=status_type)
+                for feed_pk, date, status_type in check_counts
+            ],
+            ignore_conflicts=True,
+        )
+
+        rollups = [
+            rollup
+            for rollup in cls.objects.filter(
+                feed__in={feed_pk for feed_pk, _, _ in check_counts},
+                date__in={date for _, date, _ in check_counts},
+            )
+            if (rollup.feed_id, rollup.date, rollup.status_type) in check_counts  # type: ignore
+        ]
+        for rollup in rollups:
+            key = (rollup.feed_id, rollup.date, rollup.status_type)  # type: ignore
+            rollup.count = F("count") + check_counts[key]
+        cls.objects.bulk_update(rollups, ["count"])
+
+
 class APIKey(models.Model):
     """
     API keys for various feeds. Any feed where DataHub says a key is needed is added automatically.
@@ -31,14 +31,28 @@ async function makeFeedsMap(container) {
   );
 
   map.on("load", async () => {
-    const points_url = "/api/points/";
-
-    const resp = await fetch(points_url);
-    const data = await resp.json();
+    // Clusters of feeds for each zoom level, fetched once each
+    const points = new Map();
+    const fetchPoints = async (zoom) => {
+      if (!points.has(zoom)) {
+        const resp = await fetch(`/api/points/?zoom=${zoom}`);
+        const data = await resp.json();
+        data.features.forEach((feature) => {
+          const properties = feature.properties;
+          properties.point_count = properties.point_count || 1;
+          properties.error_count =
+            properties.point_count -
+            ((properties.status_counts || {}).OK ||
+              (properties.status_type == "OK" ? 1 : 0));
+        });
+        points.set(zoom, data);
+      }
+      return points.get(zoom);
+    };
 
     map.addSource("geojson-source", {
       type: "geojson",
-      data: data,
+      data: await fetchPoints(Math.floor(map.getZoom())),
     });
 
     map.addLayer({
@@ -46,19 +60,43 @@ async function makeFeedsMap(container) {
       type: "circle",
       source: "geojson-source",
       paint: {
-        "circle-radius": 8,
+        "circle-radius": [
+          "interpolate",
+          ["linear"],
+          ["get", "point_count"],
+          1,
+          8,
+          50,
+          20,
+        ],
         "circle-opacity": 0.8,
         "circle-color": [
-          "match",
-          ["get", "status_type"],
-          "OK",
+          "case",
+          ["==", ["get", "error_count"], 0],
           "#538200",
+          ["==", ["get", "error_count"], ["get", "point_count"]],
           "#e52207",
+          "#e5a000",
         ],
       },
       filter: ["==", "$type", "Point"],
     });
 
+    map.addLayer({
+      id: "geojson-point-counts",
+      type: "symbol",
+      source: "geojson-source",
+      filter: [">", ["get", "point_count"], 1],
+      layout: {
+        "text-field": ["to-string", ["get", "point_count"]],
+        "text-font": ["Open Sans Regular", "Arial Unicode MS Regular"],
+        "text-size": 12,
+      },
+      paint: {
+        "text-color": "#ffffff",
+      },
+    });
+
     map.on("mouseenter", "geojson-points", () => {
       map.getCanvas().style.cursor = "pointer";
     });
@@ -70,13 +108,19 @@ async function makeFeedsMap(container) {
 
     map.on("click", "geojson-points", (e) => {
       const coordinates = e.features[0].geometry.coordinates.slice();
+      const properties = e.features[0].properties;
+
+      // Clusters are zoomed into, until their feeds are apart
+      if (properties.point_count > 1) {
+        map.easeTo({ center: coordinates, zoom: Math.floor(map.getZoom()) + 2 });
+        return;
+      }
+
       const description = `<a class="usa-link" href="${
-        e.features[0].properties.pk
-      }">${e.features[0].properties.issuingorganization}</a>: <span class="${
-        e.features[0].properties.status_type == "OK" ? "text-green" : "text-red"
-      }">${STATUS_TYPES[
-        e.features[0].properties.status_type
-      ].toUpperCase()}</span>`;
+        properties.pk
+      }">${properties.issuingorganization}</a>: <span class="${
+        properties.status_type == "OK" ? "text-green" : "text-red"
+      }">${STATUS_TYPES[properties.status_type].toUpperCase()}</span>`;
 
       // Ensure that if the map is zoomed out such that multiple
       // copies of the feature are visible, the popup appears
@@ -91,6 +135,12 @@ async function makeFeedsMap(container) {
         .addTo(map);
     });
 
+    map.on("zoomend", async () => {
+      map
+        .getSource("geojson-source")
+        .setData(await fetchPoints(Math.floor(map.getZoom())));
+    });
+
     const bounds = await map.getSource("geojson-source").getBounds();
     map.fitBounds(bounds, { padding: 20 });
   });
@@ -110,12 +160,33 @@ function stringToHexCode(string, saturation = 100, lightness = 45) {
   return `hsl(${hash % 360}, ${saturation}%, ${lightness}%)`;
 }
 
+const EVENTS_TILES_URL = `${window.location.origin}/api/tiles/{z}/{x}/{y}.mvt`;
+
+/**
+ * Colors each feed's events, as a style expression. Tiles only carry the feed
+ * name, so the expression is rebuilt as tiles with new feeds load.
+ *
+ * @param {Set<string>} feeds
+ * @returns expression for the color of an event
+ */
+function feedColorExpression(feeds) {
+  if (!feeds.size) {
+    return stringToHexCode("");
+  }
+
+  const expression = ["match", ["get", "feed"]];
+  feeds.forEach((feed) => {
+    expression.push(feed, stringToHexCode(feed));
+  });
+  expression.push(stringToHexCode(""));
+  return expression;
+}
+
 /**
  *
  * @param {string} container
- * @param {string[]} feeds
  */
-async function makeEventsMap(container, feeds) {
+async function makeEventsMap(container) {
   const map = new maplibregl.Map({
     container: container, // container id
     style: BASEMAP_URL, // style URL
@@ -130,192 +201,110 @@ async function makeEventsMap(container, feeds) {
   );
 
   map.on("load", async () => {
-    (
-      await Promise.all(
-        feeds.map(async (feed) => {
-          const points_url = `/api/feeds/${feed}`;
-          const layer_source = `geojson-source-${feed}`;
-          const layer_points = `geojson-points-${feed}`;
-          const layer_lines = `geojson-lines-${feed}`;
-          const layer_line_arrows = `geojson-line-arrows-${feed}`;
-
-          const resp = await fetch(points_url);
-          const data = await resp.json();
-
-          const feed_data = data["feed_data"];
-
-          if (Object.keys(feed_data).length === 0) {
-            return;
-          }
-
-          /** @type {[string, string, string, string, string, any]} */
-          const return_data = [
-            feed,
-            layer_source,
-            layer_points,
-            layer_lines,
-            layer_line_arrows,
-            feed_data,
-          ];
-
-          return return_data;
-        }),
-      )
-    ).forEach((data) => {
-      if (!data) {
-        return;
-      }
-
-      const [
-        feed,
-        layer_source,
-        layer_points,
-        layer_lines,
-        layer_line_arrows,
-        feed_data,
-      ] = data;
-
-      map.addSource(layer_source, {
-        type: "geojson",
-        data: feed_data,
-      });
+    const layer_source = "tiles-source-events";
+    const layer_points = "tiles-points-events";
+    const layer_lines = "tiles-lines-events";
+    const layer_line_arrows = "tiles-line-arrows-events";
+
+    // Tiles of the events in view are requested by the map as it moves
+    map.addSource(layer_source, {
+      type: "vector",
+      tiles: [EVENTS_TILES_URL],
+    });
 
-      map.addLayer({
-        id: layer_lines,
-        type: "line",
-        source: layer_source,
-        filter: ["==", "$type", "LineString"],
-        layout: {
-          "line-join": "round",
-          "line-cap": "round",
-        },
-        paint: {
-          "line-width": 4,
-          "line-color": stringToHexCode(feed),
-        },
-      });
+    map.addLayer({
+      id: layer_lines,
+      type: "line",
+      source: layer_source,
+      "source-layer": "events",
+      filter: ["==", "$type", "LineString"],
+      layout: {
+        "line-join": "round",
+        "line-cap": "round",
+      },
+      paint: {
+        "line-width": 4,
+        "line-color": feedColorExpression(new Set()),
+      },
+    });
 
-      map.addLayer({
-        id: layer_line_arrows,
-        type: "symbol",
-        source: layer_source,
-        minzoom: 8,
-        filter: ["==", "$type", "LineString"],
-        layout: {
-          "symbol-placement": "line",
-          "symbol-spacing": 250, // Adjusted for better visibility
-          "text-field": "▶", // Unicode right-pointing triangle
-          "text-font": ["Open Sans Regular", "Arial Unicode MS Regular"],
-          "text-size": 200,
-          "text-allow-overlap": true,
-          "text-ignore-placement": true,
-          "text-keep-upright": false, // Ensures the arrow points along the line, not just "up"
-        },
-        paint: {
-          "text-color": stringToHexCode(feed),
-          "text-halo-color": "#ffffff",
-          "text-halo-width": 1.5,
-        },
-      });
+    map.addLayer({
+      id: layer_line_arrows,
+      type: "symbol",
+      source: layer_source,
+      "source-layer": "events",
+      minzoom: 8,
+      filter: ["==", "$type", "LineString"],
+      layout: {
+        "symbol-placement": "line",
+        "symbol-spacing": 250, // Adjusted for better visibility
+        "text-field": "▶", // Unicode right-pointing triangle
+        "text-font": ["Open Sans Regular", "Arial Unicode MS Regular"],
+        "text-size": 200,
+        "text-allow-overlap": true,
+        "text-ignore-placement": true,
+        "text-keep-upright": false, // Ensures the arrow points along the line, not just "up"
+      },
+      paint: {
+        "text-color": feedColorExpression(new Set()),
+        "text-halo-color": "#ffffff",
+        "text-halo-width": 1.5,
+      },
+    });
 
-      map.addLayer({
-        id: layer_points,
-        type: "circle",
-        source: layer_source,
-        filter: ["==", "$type", "Point"],
-        paint: {
-          "circle-radius": 4,
-          "circle-color": stringToHexCode(feed),
-        },
-      });
+    map.addLayer({
+      id: layer_points,
+      type: "circle",
+      source: layer_source,
+      "source-layer": "events",
+      filter: ["==", "$type", "Point"],
+      paint: {
+        "circle-radius": 4,
+        "circle-color": feedColorExpression(new Set()),
+      },
+    });
 
-      map.on("click", layer_points, (e) => {
+    [layer_points, layer_lines].forEach((layer) => {
+      map.on("click", layer, (e) => {
         const coordinates = e.lngLat;
-        let description = `<a class="usa-link" href="${feed}">View feed (${feed})</a>`;
-
-        if (e.features[0].properties.core_details) {
-          const core_details = JSON.parse(
-            e.features[0].properties.core_details,
-          );
-          description += `<ul class="usa-list usa-list--unstyled">
-        <li>ID: ${e.features[0].id} </li>
-        <li>Event Type: ${core_details.event_type}</li>
-        <li>Roads: ${core_details.road_names}</li>
-        <li>Direction: ${core_details.direction}</li>
-        <li>Start Date: ${e.features[0].properties.start_date}</li>
-        <li>End Date: ${e.features[0].properties.end_date}</li>
-        <li>Vehicle Impact: ${e.features[0].properties.vehicle_impact}</li>
-        </ul>
-        `;
-        } else {
-          description += `<ul class="usa-list usa-list--unstyled">
-        <li>ID: ${e.features[0].id} </li>
-        <li>Event Type: ${e.features[0].properties.event_type}</li>
-        <li>Roads: ${e.features[0].properties.road_names}</li>
-        <li>Direction: ${e.features[0].properties.direction}</li>
-        <li>Start Date: ${e.features[0].properties.start_date}</li>
-        <li>End Date: ${e.features[0].properties.end_date}</li>
-        <li>Vehicle Impact: ${e.features[0].properties.vehicle_impact}</li>
+        const properties = e.features[0].properties;
+        const description = `<a class="usa-link" href="${properties.feed}">View feed (${properties.feed})</a>
+        <ul class="usa-list usa-list--unstyled">
+        <li>ID: ${properties.event_id} </li>
+        <li>Event Type: ${properties.event_type}</li>
+        <li>Roads: ${JSON.parse(properties.road_names)}</li>
+        <li>Direction: ${properties.direction}</li>
+        <li>Start Date: ${properties.start_date}</li>
+        <li>End Date: ${properties.end_date}</li>
+        <li>Vehicle Impact: ${properties.vehicle_impact}</li>
         </ul>
         `;
-        }
-
-        // Ensure that if the map is zoomed out such that multiple
-        // copies of the feature are visible, the popup appears
-        // over the copy being pointed to.
-        while (Math.abs(e.lngLat.lng - coordinates[0]) > 180) {
-          coordinates[0] += e.lngLat.lng > coordinates[0] ? 360 : -360;
-        }
 
         new maplibregl.Popup()
           .setLngLat(coordinates)
           .setHTML(description)
           .addTo(map);
       });
+    });
 
-      map.on("click", layer_lines, (e) => {
-        const coordinates = e.lngLat;
-        let description = `<a class="usa-link" href="${feed}">View feed (${feed})</a>`;
-
-        if (e.features[0].properties.core_details) {
-          const core_details = JSON.parse(
-            e.features[0].properties.core_details,
-          );
-          description += `<ul class="usa-list usa-list--unstyled">
-        <li>ID: ${e.features[0].id} </li>
-        <li>Event Type: ${core_details.event_type}</li>
-        <li>Roads: ${core_details.road_names}</li>
-        <li>Direction: ${core_details.direction}</li>
-        <li>Start Date: ${e.features[0].properties.start_date}</li>
-        <li>End Date: ${e.features[0].properties.end_date}</li>
-        <li>Vehicle Impact: ${e.features[0].properties.vehicle_impact}</li>
-        </ul>
-        `;
-        } else {
-          description += `<ul class="usa-list usa-list--unstyled">
-        <li>ID: ${e.features[0].id} </li>        
-        <li>Event Type: ${e.features[0].properties.event_type}</li>
-        <li>Roads: ${e.features[0].properties.road_names}</li>
-        <li>Direction: ${e.features[0].properties.direction}</li>
-        <li>Start Date: ${e.features[0].properties.start_date}</li>
-        <li>End Date: ${e.features[0].properties.end_date}</li>
-        <li>Vehicle Impact: ${e.features[0].properties.vehicle_impact}</li>
-        </ul>
-        `;
-        }
+    const feeds = new Set();
+    map.on("sourcedata", (e) => {
+      if (e.sourceId !== layer_source || !e.isSourceLoaded) {
+        return;
+      }
 
-        // Ensure that if the map is zoomed out such that multiple
-        // copies of the feature are visible, the popup appears
-        // over the copy being pointed to.
-        while (Math.abs(e.lngLat.lng - coordinates[0]) > 180) {
-          coordinates[0] += e.lngLat.lng > coordinates[0] ? 360 : -360;
-        }
+      const count = feeds.size;
+      map
+        .querySourceFeatures(layer_source, { sourceLayer: "events" })
+        .forEach((feature) => feeds.add(feature.properties.feed));
+      if (feeds.size === count) {
+        return;
+      }
 
-        new maplibregl.Popup()
-          .setLngLat(coordinates)
-          .setHTML(description)
-          .addTo(map);
-      });
+      const color = feedColorExpression(feeds);
+      map.setPaintProperty(layer_lines, "line-color", color);
+      map.setPaintProperty(layer_line_arrows, "text-color", color);
+      map.setPaintProperty(layer_points, "circle-color", color);
     });
   });
 }
@@ -1,3 +1,321 @@
-# from django.test import TestCase
+import asyncio
+import copy
+import io
+import json
+import random
+import re
+from typing import Any
+from unittest import mock
 
-# Create your tests here.
+from api.views import FeedPointsViewSet
+from archive import views as archive_views
+from archive.delta import apply_delta, diff_feeds
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase
+from referencing.jsonschema import DRAFT7
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from shared import schema_check
+from shared.json_stream import load_feed_json
+from shared.schema_check import (
+    REGISTRY,
+    VERSION_TO_SCHEMA,
+    VERSION_TO_SCHEMA_FILE,
+    get_content_hash,
+    get_feature_schema_errors,
+)
+from shared.schema_compile import mutate
+
+from .management.commands.compileschemas import validators_agree
+from .management.commands.syncdatahub import inject_dashboard_id
+
+# Values for string schemas with a format or pattern, so generated feeds are mostly valid
+STRING_FORMATS = {
+    "date-time": "2024-01-01T00:00:00Z",
+    "date": "2024-01-01",
+    "uri": "https://example.com/",
+    "email": "publisher@example.com",
+}
+PATTERN_CANDIDATES = ["4.2", "x", "2024-01-01T00:00:00Z", "#000000", "1"]
+
+# Keywords that don't describe an instance, so a schema of only these is empty
+ANNOTATIONS = {"$id", "$schema", "title", "description"}
+
+# Optional properties and array items stop being generated past this depth
+MAX_DEPTH = 6
+
+
+def merge(instance: Any, other: Any) -> Any:
+    if isinstance(instance, dict) and isinstance(other, dict):
+        return {**instance, **other}
+    return instance if other is None else other
+
+
+def generate(schema, resolver, rng: random.Random, depth: int = 0) -> Any:
+    """
+    A random instance of a schema. Choices (``oneOf`` options, enums, optional properties) are random, so instances are often, but not always, valid.
+    """
+
+    if schema is True or schema == {}:
+        return "x"
+    if "$id" in schema:
+        resolver = resolver.in_subresource(DRAFT7.create_resource(schema))
+    if "$ref" in schema:
+        resolved = resolver.lookup(schema["$ref"])
+        return generate(resolved.contents, resolved.resolver, rng, depth)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+
+    for keyword in ("allOf", "oneOf", "anyOf"):
+        if keyword in schema:
+            base = {key: value for key, value in schema.items() if key != keyword}
+            instance = (
+                generate(base, resolver, rng, depth)
+                if base.keys() - ANNOTATIONS
+                else None
+            )
+            parts = (
+                schema[keyword] if keyword == "allOf" else [rng.choice(schema[keyword])]
+            )
+            for part in parts:
+                instance = merge(instance, generate(part, resolver, rng, depth))
+            return instance
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = rng.choice(schema_type)
+    if schema_type is None:
+        schema_type = (
+            "object" if "properties" in schema or "required" in schema else "string"
+        )
+
+    if schema_type == "object":
+        required = set(schema.get("required", []))
+        return {
+            name: generate(subschema, resolver, rng, depth + 1)
+            for name, subschema in schema.get("properties", {}).items()
+            if name in required or (depth < MAX_DEPTH and rng.random() < 0.5)
+        }
+    if schema_type == "array":
+        items = schema.get("items", {})
+        if isinstance(items, list):
+            return [generate(item, resolver, rng, depth + 1) for item in items]
+        count = max(schema.get("minItems", 0), 1 if depth < MAX_DEPTH else 0)
+        return [generate(items, resolver, rng, depth + 1) for _ in range(count)]
+    if schema_type == "string":
+        if "pattern" in schema:
+            return next(
+                (
+                    candidate
+                    for candidate in PATTERN_CANDIDATES
+                    if re.search(schema["pattern"], candidate)
+                ),
+                "x",
+            )
+        return STRING_FORMATS.get(
+            schema.get("format"), "x" * max(schema.get("minLength", 1), 1)
+        )
+    if schema_type in ("number", "integer"):
+        if "exclusiveMinimum" in schema:
+            return schema["exclusiveMinimum"] + 1
+        return schema.get("minimum", 0)
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def generate_feed(version: str, rng: random.Random) -> Any:
+    resolved = REGISTRY.resolver().lookup(VERSION_TO_SCHEMA[version])
+    return generate(resolved.contents, resolved.resolver, rng)
+
+
+class FastValidatorTests(SimpleTestCase):
+    """The generated validators (see :mod:`shared.schema_compile`) against jsonschema's Draft7Validator."""
+
+    FEEDS = 20
+    MUTATIONS = 10
+
+    def test_validators_agree(self):
+        for version in VERSION_TO_SCHEMA_FILE:
+            rng = random.Random(0)
+            for _ in range(self.FEEDS):
+                feed = generate_feed(version, rng)
+                samples = [feed] + [mutate(feed, rng) for _ in range(self.MUTATIONS)]
+                for sample in samples:
+                    with self.subTest(version=version, feed=sample):
+                        self.assertTrue(validators_agree(sample, version))
+
+
+def make_feed(version: str, features: list[Any]) -> Any:
+    """A generated feed with the given features, each given an ``ID_for_dashboard`` as syncdatahub would."""
+
+    feed = generate_feed(version, random.Random(0))
+    feed["features"] = copy.deepcopy(features)
+    for index, feature in enumerate(feed["features"]):
+        inject_dashboard_id(feature, index)
+    return feed
+
+
+def make_features(version: str, count: int, rng: random.Random) -> list[Any]:
+    template = generate_feed(version, rng)["features"][0]
+    return [{**copy.deepcopy(template), "id": f"event-{i}"} for i in range(count)]
+
+
+class FeatureSchemaErrorsTests(SimpleTestCase):
+    """Incremental, bounded validation of features, with :func:`shared.schema_check.get_feature_schema_errors`."""
+
+    def count_validated(self, *args, **kwargs):
+        """Errors for a feed, with the number of features that were validated (rather than reused)."""
+
+        with mock.patch.object(
+            schema_check, "is_valid_fast", wraps=schema_check.is_valid_fast
+        ) as is_valid_fast:
+            result = get_feature_schema_errors(*args, **kwargs)
+
+        validated = sum(
+            call.kwargs.get("feature", False) for call in is_valid_fast.call_args_list
+        )
+        return result, validated
+
+    def test_inserted_feature_keeps_others_memoized(self):
+        features = make_features("4.2", 5, random.Random(1))
+        first, validated = self.count_validated(make_feed("4.2", features), "4.2")
+        self.assertEqual(validated, 5)
+
+        # Inserting a feature renumbers every later feature's ID_for_dashboard
+        inserted = {**copy.deepcopy(features[0]), "id": "event-new"}
+        feed = make_feed("4.2", [inserted] + features)
+        second, validated = self.count_validated(
+            feed, "4.2", known_feature_errors=first["feature_errors"]
+        )
+        self.assertEqual(validated, 1)
+        self.assertEqual(len(second["feature_errors"]), 6)
+
+    def test_max_errors_within_first_feature(self):
+        features = make_features("4.2", 5, random.Random(1))
+        for feature in features:
+            # Each of these is an error of its own
+            feature.update(type=1, geometry=2, bbox=3)
+            feature["properties"]["core_details"].update(
+                data_source_id=1, road_names=2, direction=3
+            )
+        feed = make_feed("4.2", features)
+        unbounded = get_feature_schema_errors(feed, "4.2")
+        self.assertGreaterEqual(len(unbounded["errors"]), 5 * 6)
+
+        result = get_feature_schema_errors(feed, "4.2", max_errors=3)
+        self.assertTrue(result["estimated"])
+        self.assertEqual(len(result["errors"]), 3)
+        # The one feature validated stands for all five
+        self.assertEqual(sum(weight for _, weight in result["errors"]), 15)
+        # Only part of its errors were found, so it isn't memoized
+        self.assertEqual(result["feature_errors"], {})
+
+
+class LoadFeedJsonTests(SimpleTestCase):
+    """Streamed parsing of feed payloads, with :func:`shared.json_stream.load_feed_json`."""
+
+    def test_same_as_json_loads(self):
+        payload = b'{"a": [1, -2, 1.5, 1e3, 2E-2, true, null, "x"], "b": {"c": {}}}'
+        self.assertEqual(load_feed_json(io.BytesIO(payload)), json.loads(payload))
+
+    def test_integer_beyond_64_bits(self):
+        payload = b'{"id": 123456789012345678901234567890, "lat": 38.9}'
+        data = load_feed_json(io.BytesIO(payload))
+        self.assertEqual(data, {"id": 123456789012345678901234567890, "lat": 38.9})
+        self.assertIsInstance(data["lat"], float)
+
+
+class DeltaTests(SimpleTestCase):
+    """Archived feeds stored as changes from the previous one, with :mod:`archive.delta`."""
+
+    def assertReplays(self, previous, current):
+        delta = diff_feeds(previous, current)
+        self.assertIsNotNone(delta)
+        self.assertEqual(
+            get_content_hash(apply_delta(previous, delta)), get_content_hash(current)
+        )
+        return delta
+
+    def test_inserted_feature(self):
+        features = make_features("4.2", 100, random.Random(1))
+        previous = make_feed("4.2", features)
+        inserted = {**copy.deepcopy(features[0]), "id": "event-new"}
+        current = make_feed("4.2", [inserted] + features)
+
+        # Only the new feature is stored, though every later ID_for_dashboard changed
+        delta = self.assertReplays(previous, current)
+        self.assertEqual(list(delta["added"]), ["event-new"])
+        self.assertEqual(delta["modified"], {})
+        self.assertEqual(delta["removed"], [])
+
+    def test_values_of_another_type(self):
+        features = make_features("4.2", 1, random.Random(1))
+        features[0]["properties"]["lanes_count"] = 1
+        previous = make_feed("4.2", features)
+        for value in [True, 1.0]:
+            features[0]["properties"]["lanes_count"] = value
+            delta = self.assertReplays(previous, make_feed("4.2", features))
+            self.assertEqual(list(delta["modified"]), ["event-0"])
+
+
+class ArchiveZipTests(SimpleTestCase):
+    """Downloading archives as a zip file, with :func:`archive.views.download_all_in_zip`."""
+
+    def test_streamed_under_asgi(self):
+        sent: list[bytes] = []
+        # How many chunks had been sent when each chunk was made
+        sent_before: list[int] = []
+
+        def stream_zip_file(files):
+            for chunk in [b"first", b"second", b"third"]:
+                sent_before.append(len(sent))
+                yield chunk
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                sent.append(message["body"])
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/archive/zip",
+            "query_string": b"",
+            "headers": [],
+            "server": ("testserver", 80),
+        }
+
+        async def request():
+            # The request has no body, and the client doesn't disconnect
+            received: asyncio.Queue = asyncio.Queue()
+            received.put_nowait({"type": "http.request", "body": b""})
+            await ASGIHandler()(scope, received.get, send)
+
+        with mock.patch.object(archive_views, "stream_zip_file", stream_zip_file):
+            asyncio.run(request())
+
+        self.assertEqual(sent, [b"first", b"second", b"third"])
+        # Each chunk was sent before the next one was made
+        self.assertEqual(sent_before, [0, 1, 2])
+
+
+class FeedPointsZoomTests(SimpleTestCase):
+    """The ``zoom`` parameter of :class:`api.views.FeedPointsViewSet`."""
+
+    def get_zoom(self, zoom: str):
+        view = FeedPointsViewSet()
+        view.request = Request(APIRequestFactory().get("/", {"zoom": zoom}))
+        return view.get_zoom()
+
+    def test_zoom(self):
+        self.assertEqual(self.get_zoom("5.7"), 5)
+        self.assertEqual(self.get_zoom("-1"), 0)
+        self.assertIsNone(self.get_zoom("30"))
+
+    def test_invalid_zoom(self):
+        for zoom in ["abc", "", "nan", "inf", "-inf", "1e400"]:
+            with self.subTest(zoom=zoom), self.assertRaises(ValidationError):
+                self.get_zoom(zoom)
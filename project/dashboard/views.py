@@ -1,12 +1,11 @@
 from datetime import date, timedelta
 from typing import Optional, Union
 
-from django.contrib.gis.db.models import Count
 from django.core.paginator import Page, Paginator
 from django.views.generic import DetailView, ListView
 
 from .forms import SearchForm
-from .models import Feed, FeedStatus
+from .models import Feed, FeedStatusRollup
 
 
 def get_page_button_array(
@@ -63,7 +62,6 @@ def get_context_data(self, **kwargs):
             context["paginator"], context["page_obj"]
         )
         context["search_form"] = SearchForm()
-        context["feeds_pk"] = [pk for pk in Feed.objects.values_list("pk", flat=True)]
 
         return context
 
@@ -85,24 +83,12 @@ def get_context_data(self, **kwargs):
         enddate = date.today()
         startdate = enddate - timedelta(days=14)
 
-        total_status_count = FeedStatus.objects.filter(
-            feed=context["feed"].pk, datetime_checked__range=[startdate, enddate]
-        ).count()
-
-        context["status_summary"] = [
-            (
-                FeedStatus.StatusType(status["status_type"]).label,
-                str(round(status["count"] / total_status_count * 100, 2)),
-            )
-            for status in (
-                FeedStatus.objects.filter(
-                    feed=context["feed"].pk,
-                    datetime_checked__range=[startdate, enddate],
-                )
-                .values("status_type")
-                .annotate(count=Count("status_type"))
-                .order_by("-count")
+        context["status_summary"] = (
+            FeedStatusRollup.objects.filter(
+                feed=context["feed"].pk, date__gte=startdate, date__lt=enddate
             )
-        ]
+            .status_summary()
+            .get(context["feed"].pk, [])
+        )
 
         return context
@@ -0,0 +1,142 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Optional, TypedDict
+
+import iso8601
+
+
+class FeedAnalysis(TypedDict):
+    latest_update_date: Optional[datetime]
+    # Sorted, oldest first
+    end_dates: list[datetime]
+    event_type_counts: dict[str, int]
+    feature_count: int
+    work_zone_count: int
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+
+    try:
+        return iso8601.parse_date(value, default_timezone=timezone.utc)
+    except iso8601.ParseError:
+        return None
+
+
+def get_event_type(feature: Any, version: str) -> Optional[str]:
+    """Event type of a feature, wherever the feed's version puts it."""
+
+    if not isinstance(feature, dict):
+        return None
+
+    properties = feature.get("properties")
+    if not isinstance(properties, dict):
+        return None
+
+    if version.startswith("3"):
+        event_type = properties.get("event_type")
+    elif version.startswith("4"):
+        core_details = properties.get("core_details")
+        event_type = (
+            core_details.get("event_type") if isinstance(core_details, dict) else None
+        )
+    else:
+        event_type = None
+
+    return event_type if isinstance(event_type, str) else None
+
+
+class EventDetails(TypedDict):
+    event_id: str
+    event_type: str
+    road_names: list[str]
+    direction: str
+    start_date: Optional[datetime]
+    end_date: Optional[datetime]
+    vehicle_impact: str
+    geometry: Optional[dict[str, Any]]
+
+
+def get_event_details(feature: Any, version: str) -> EventDetails:
+    """
+    The fields of a feature that event queries filter on, wherever its version puts them. WZDx 4.x and CWZ keep most in ``core_details``, and 3.x directly in the properties (with a single ``road_name`` in 3.0).
+    """
+
+    feature = feature if isinstance(feature, dict) else {}
+    properties = feature.get("properties")
+    properties = properties if isinstance(properties, dict) else {}
+    core_details = properties.get("core_details")
+    details = core_details if isinstance(core_details, dict) else properties
+
+    event_id = feature.get("id", properties.get("road_event_id"))
+
+    road_names = details.get("road_names")
+    if not isinstance(road_names, list):
+        road_name = details.get("road_name")
+        road_names = [road_name] if road_name else []
+
+    geometry = feature.get("geometry")
+
+    return {
+        "event_id": str(event_id) if isinstance(event_id, (str, int)) else "",
+        "event_type": get_event_type(feature, version) or "",
+        "road_names": [name for name in road_names if isinstance(name, str)],
+        "direction": (
+            details["direction"] if isinstance(details.get("direction"), str) else ""
+        ),
+        "start_date": parse_date(properties.get("start_date")),
+        "end_date": parse_date(properties.get("end_date")),
+        "vehicle_impact": (
+            properties["vehicle_impact"]
+            if isinstance(properties.get("vehicle_impact"), str)
+            else ""
+        ),
+        "geometry": geometry if isinstance(geometry, dict) else None,
+    }
+
+
+def analyze_feed(feed_data: Any, version: str) -> FeedAnalysis:
+    """
+    Collects every fact checkfeeds and the dashboard need from feed data in a single traversal.
+
+    Dates are found the same way as :func:`shared.schema_check.find_all_instances_key`, ie. in nested objects but not in arrays (so feed info dates, not event dates).
+    """
+
+    update_dates: list[datetime] = []
+    end_dates: list[datetime] = []
+    event_types: Counter[str] = Counter()
+    feature_count = 0
+
+    if isinstance(feed_data, dict):
+        features = feed_data.get("features")
+        if isinstance(features, list):
+            feature_count = len(features)
+            for feature in features:
+                event_type = get_event_type(feature, version)
+                if event_type is not None:
+                    event_types[event_type] += 1
+
+        stack = [feed_data]
+        while stack:
+            obj = stack.pop()
+            for key, value in obj.items():
+                if key == "update_date":
+                    update_date = parse_date(value)
+                    if update_date is not None:
+                        update_dates.append(update_date)
+                elif key == "end_date":
+                    end_date = parse_date(value)
+                    if end_date is not None:
+                        end_dates.append(end_date)
+
+                if isinstance(value, dict):
+                    stack.append(value)
+
+    return {
+        "latest_update_date": max(update_dates, default=None),
+        "end_dates": sorted(end_dates),
+        "event_type_counts": dict(event_types),
+        "feature_count": feature_count,
+        "work_zone_count": event_types["work-zone"],
+    }
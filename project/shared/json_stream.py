@@ -0,0 +1,105 @@
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import ijson
+
+# Prefixes (in ijson terms) of every GeoJSON feature, for both a bare FeatureCollection and a list of FeatureCollections
+FEATURE_PREFIXES = {"features.item", "item.features.item"}
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+class PayloadTooLargeError(ValueError):
+    pass
+
+
+class LimitedReader:
+    """
+    File-like wrapper around an iterable of byte chunks (eg. ``Response.iter_content()``) that raises :class:`PayloadTooLargeError` once more than ``max_size`` bytes have been read.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], max_size: Optional[int] = None):
+        self.chunks: Iterator[bytes] = iter(chunks)
+        self.max_size = max_size
+        self.bytes_read = 0
+        self.buffer = b""
+        self.first_chunk = True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                break
+
+            if self.first_chunk and chunk:
+                chunk = chunk.removeprefix(UTF8_BOM)
+                self.first_chunk = False
+
+            self.bytes_read += len(chunk)
+            if self.max_size is not None and self.bytes_read > self.max_size:
+                raise PayloadTooLargeError(
+                    f"Payload is larger than the maximum of {self.max_size} bytes"
+                )
+
+            self.buffer += chunk
+
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+
+        return data
+
+
+def load_feed_json(
+    stream: Any,
+    on_feature: Optional[Callable[[dict[str, Any], int], None]] = None,
+) -> Any:
+    """
+    Incrementally parses a JSON document from a binary file-like object, without ever holding the raw document in memory.
+
+    ``on_feature`` is called with each GeoJSON feature (and its index) as soon as it's parsed, so features can be modified in place without walking the result again.
+    """
+
+    root: list[Any] = []
+    # Stack of (container, key of the next value) for each open map/array
+    containers: list[tuple[Any, Optional[str]]] = [(root, None)]
+
+    def add_value(value):
+        container, key = containers[-1]
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+
+    try:
+        # Without use_float, since the C backend can't parse integers beyond 64 bits with it. Other numbers come as Decimals, and are converted to floats as json.loads would
+        for prefix, event, value in ijson.parse(stream):
+            if event == "map_key":
+                containers[-1] = (containers[-1][0], value)
+            elif event == "start_map":
+                new_map: dict[str, Any] = {}
+                add_value(new_map)
+                containers.append((new_map, None))
+            elif event == "start_array":
+                new_array: list[Any] = []
+                add_value(new_array)
+                containers.append((new_array, None))
+            elif event == "end_map":
+                feature = containers.pop()[0]
+                if on_feature is not None and prefix in FEATURE_PREFIXES:
+                    on_feature(feature, len(containers[-1][0]) - 1)
+            elif event == "end_array":
+                containers.pop()
+            elif isinstance(value, Decimal):
+                add_value(float(value))
+            else:
+                add_value(value)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
+    if len(root) == 0:
+        raise ValueError("Invalid JSON: empty document")
+
+    return root[0]
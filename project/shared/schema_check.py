@@ -1,13 +1,23 @@
+import hashlib
 import json
 import os
+import random
+from functools import cache
+from itertools import islice
 from pathlib import Path
-from typing import Any, Mapping, Optional, Sequence
+from typing import Any, Iterable, Iterator, Mapping, Optional, Sequence, TypedDict
 
 import requests
+from fastjsonschema import JsonSchemaException
 from jsonschema import Draft7Validator, ValidationError
 from jsonschema.exceptions import best_match
 from referencing import Registry, Resource
 
+from .schema_compile import compile_schema, load_compiled_validator
+
+# Pointer to the schema of a single feature, in every feed schema version
+FEATURE_POINTER = "#/properties/features/items"
+
 SCHEMA_FOLDER = Path(os.path.dirname(__file__)) / "schemas"
 
 VERSION_TO_SCHEMA = {
@@ -21,6 +31,18 @@
 }
 
 
+# Bundled copies of each schema, in SCHEMA_FOLDER
+VERSION_TO_SCHEMA_FILE = {
+    "4.2": "wzdx42.schema.json",
+    "4.1": "wzdx41.schema.json",
+    "4.0": "wzdx40.schema.json",
+    "3.1": "wzdx31.schema.json",
+    "3.0": "wzdx30.schema.json",
+    "2.0": "wzdx20.schema.json",
+    "1.0": "cwz10.schema.json",  # CWZ 1.0
+}
+
+
 def get_schema_json(filename: str):
     with open(SCHEMA_FOLDER / filename, "r") as f:
         return json.load(f)
@@ -39,6 +61,33 @@ def format_as_index(container: str, indices: Sequence):
     return f"{container}[{']['.join(repr(index) for index in indices)}]"
 
 
+def get_content_hash(data: Any) -> str:
+    """SHA-256 hash of the canonical JSON form of data (sorted keys, no whitespace), to detect payload changes."""
+    canonical_json = json.dumps(
+        data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
+
+
+def get_feature_hash(feature: Any) -> str:
+    """
+    Hash of a feature, to tell which features changed from one payload to the next. Leaves out the ``ID_for_dashboard`` syncdatahub adds, which is numbered by the feature's position, so features keep their hash when others are added or removed before them.
+    """
+
+    properties = feature.get("properties") if isinstance(feature, dict) else None
+    if isinstance(properties, dict) and "ID_for_dashboard" in properties:
+        feature = {
+            **feature,
+            "properties": {
+                key: value
+                for key, value in properties.items()
+                if key != "ID_for_dashboard"
+            },
+        }
+
+    return get_content_hash(feature)
+
+
 def find_all_instances_key(
     obj: dict[str, Any], key: str, key_to_skip: Optional[str] = None
 ):
@@ -51,71 +100,258 @@ def find_all_instances_key(
                 yield from item
 
 
-def get_formatted_errors(errors: list[ValidationError], feedname: str):
+class SchemaErrorRecord(TypedDict):
+    """A schema error reduced to what's shown on the dashboard, so it can be stored as JSON."""
+
+    message: str
+    path: list[str | int]
+
+
+def get_error_records(errors: list[ValidationError]) -> Iterator[SchemaErrorRecord]:
 
     for error in errors:
         if error.context is None or len(error.context) == 0:
             # No sub errors
-            yield (error.message, format_as_index(feedname, error.path))
+            yield {"message": error.message, "path": list(error.path)}
         else:
             # Get most relevant suberror, save that
             best_error: ValidationError = best_match(error.context)
             if type(best_error) is ValidationError:
-                yield (
-                    best_error.message,
-                    format_as_index(
-                        format_as_index(feedname, error.path),
-                        best_error.path,
-                    ),
-                )
+                yield {
+                    "message": best_error.message,
+                    "path": list(error.path) + list(best_error.path),
+                }
+
+
+def get_formatted_errors(errors: list[ValidationError], feedname: str):
+
+    for record in get_error_records(errors):
+        yield (record["message"], format_as_index(feedname, record["path"]))
 
 
 # GET ALL SCHEMAS AND SAVE IN REGISTRY (minimizes time to analyze schema)
-REGISTRY = Registry(retrieve=retrieve_via_web).with_resources(
-    [
-        (
-            "https://raw.githubusercontent.com/ite-org/cwz/refs/heads/main/schemas/1.0/WorkZoneFeed.json",
-            Resource.from_contents(get_schema_json("cwz10.schema.json")),
-        ),
-        (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/4.2/WorkZoneFeed.json",
-            Resource.from_contents(get_schema_json("wzdx42.schema.json")),
-        ),
-        (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/4.1/WorkZoneFeed.json",
-            Resource.from_contents(get_schema_json("wzdx41.schema.json")),
-        ),
+# Crawled up front, so that embedded schemas (eg. GeoJSON geometries) are found directly, rather than crawling the registry again on every lookup
+REGISTRY = (
+    Registry(retrieve=retrieve_via_web)
+    .with_resources(
         (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/4.0/WZDxFeed.json",
-            Resource.from_contents(get_schema_json("wzdx40.schema.json")),
-        ),
-        (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/3.1/WZDxFeed.json",
-            Resource.from_contents(get_schema_json("wzdx31.schema.json")),
-        ),
-        (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/2.0/WZDxFeed.json",
-            Resource.from_contents(get_schema_json("wzdx30.schema.json")),
-        ),
-        (
-            "https://raw.githubusercontent.com/usdot-jpo-ode/wzdx/main/schemas/2.0/WZDxFeed.json",
-            Resource.from_contents(get_schema_json("wzdx20.schema.json")),
-        ),
-    ]
+            VERSION_TO_SCHEMA[version],
+            Resource.from_contents(get_schema_json(filename)),
+        )
+        for version, filename in VERSION_TO_SCHEMA_FILE.items()
+    )
+    .crawl()
 )
 
 
-def get_version_schema_errors(data: Any, version: str) -> list[ValidationError]:
-    """If feed data fails to validate against JSON schema (with schema version)"""
+@cache
+def get_version_validator(version: str) -> Draft7Validator:
+    """
+    Returns a validator for a schema version, built once per process. The version's feed schema is resolved up front, rather than through a ``$ref`` on every validation.
+    """
+
+    schema = REGISTRY.resolver().lookup(VERSION_TO_SCHEMA[version]).contents
+
+    return Draft7Validator(schema, registry=REGISTRY)
+
+
+@cache
+def get_feature_validator(version: str) -> Draft7Validator:
+    """Validator for a single element of ``features``, with refs still resolved relative to the feed schema."""
+
+    validator = get_version_validator(version)
+
+    return validator.evolve(schema=validator.schema["properties"]["features"]["items"])
+
+
+def get_compiled_module_name(version: str, feature: bool = False) -> str:
+    module_name = VERSION_TO_SCHEMA_FILE[version].removesuffix(".schema.json")
+    return f"{module_name}_feature" if feature else module_name
+
 
-    return get_schema_errors(data, {"$ref": VERSION_TO_SCHEMA[version]})
+@cache
+def get_fast_validator(version: str, feature: bool = False):
+    """
+    Returns a validator generated specifically for a schema version (or only its features), which only tells whether data is valid. Uses the module written by ``manage.py compileschemas`` if it exists, otherwise the code is generated in memory.
+    """
+
+    validate = load_compiled_validator(get_compiled_module_name(version, feature))
+    if validate is not None:
+        return validate
+
+    return compile_schema(
+        REGISTRY.contents(VERSION_TO_SCHEMA[version]),
+        VERSION_TO_SCHEMA[version],
+        FEATURE_POINTER if feature else None,
+    )
+
+
+def is_valid_fast(data: Any, version: str, feature: bool = False) -> bool:
+    """If data is valid according to the generated validator for the schema version."""
+    try:
+        get_fast_validator(version, feature)(data)
+    except JsonSchemaException:
+        return False
+
+    return True
+
+
+def get_version_schema_errors(
+    data: Any, version: str, max_errors: Optional[int] = None
+) -> list[ValidationError]:
+    """If feed data fails to validate against JSON schema (with schema version). Stops after ``max_errors`` errors, if given."""
+
+    # Most feeds are valid, so only use the (much slower) Draft7Validator to collect errors when there are any
+    if is_valid_fast(data, version):
+        return []
+
+    return sorted(
+        islice(get_version_validator(version).iter_errors(data), max_errors), key=str
+    )
+
+
+class FeatureSchemaErrors(TypedDict):
+    # Each error, with how many errors it stands for (more than 1 for features that were sampled)
+    errors: list[tuple[SchemaErrorRecord, float]]
+    # Errors of each validated feature, by hash, to pass in as known_feature_errors next time
+    feature_errors: dict[str, list[SchemaErrorRecord]]
+    # If not every feature was validated, or validation stopped early
+    estimated: bool
+
+
+def get_feature_schema_errors(
+    data: Any,
+    version: str,
+    known_feature_errors: Optional[Mapping[str, list[SchemaErrorRecord]]] = None,
+    max_errors: Optional[int] = None,
+    sample_size: Optional[int] = None,
+) -> FeatureSchemaErrors:
+    """
+    Same errors as :func:`get_version_schema_errors`, but each feature is validated on its own, and only if its hash isn't in ``known_feature_errors`` (the errors of every feature from the last check).
+
+    For badly broken feeds, validation of new features stops after ``max_errors`` errors or ``sample_size`` features. Features are then validated in a random (but repeatable) order, and the errors of the ones validated stand for those that weren't.
+    """
+
+    known_feature_errors = known_feature_errors or {}
+    result: FeatureSchemaErrors = {
+        "errors": [],
+        "feature_errors": {},
+        "estimated": False,
+    }
+
+    features = data.get("features") if isinstance(data, dict) else None
+    if not isinstance(features, list):
+        # Nothing to split up
+        errors = get_version_schema_errors(data, version, max_errors)
+        result["errors"] = [(record, 1.0) for record in get_error_records(errors)]
+        result["estimated"] = max_errors is not None and len(errors) >= max_errors
+        return result
+
+    # Everything apart from features ("features" only has to be an array, which it is)
+    feed_errors = get_version_schema_errors(
+        {**data, "features": []}, version, max_errors
+    )
+    result["errors"] = [(record, 1.0) for record in get_error_records(feed_errors)]
+    error_count = len(feed_errors)
+
+    feature_hashes = [get_feature_hash(feature) for feature in features]
+    new_features = {
+        feature_hash: feature
+        for feature_hash, feature in zip(feature_hashes, features)
+        if feature_hash not in known_feature_errors
+    }
+
+    validation_order = list(new_features)
+    if max_errors is not None or sample_size is not None:
+        random.Random(len(features)).shuffle(validation_order)
+
+    feature_errors = result["feature_errors"]
+    # Features whose errors were cut off by max_errors. They're reported, but not memoized
+    truncated_errors: dict[str, list[SchemaErrorRecord]] = {}
+    for feature_hash in validation_order:
+        if (sample_size is not None and len(feature_errors) >= sample_size) or (
+            max_errors is not None and error_count >= max_errors
+        ):
+            result["estimated"] = True
+            break
+
+        feature = new_features[feature_hash]
+        if is_valid_fast(feature, version, feature=True):
+            records = []
+        else:
+            remaining_errors = None if max_errors is None else max_errors - error_count
+            records = list(
+                get_error_records(
+                    islice(
+                        get_feature_validator(version).iter_errors(feature),
+                        remaining_errors,
+                    )
+                )
+            )
+            if remaining_errors is not None and len(records) >= remaining_errors:
+                # Only part of this feature's errors, so it can't be reused
+                result["estimated"] = True
+                truncated_errors[feature_hash] = records
+                error_count += len(records)
+                continue
+
+        feature_errors[feature_hash] = records
+        error_count += len(records)
+
+    # Each validated new feature stands for the new features that weren't validated
+    new_feature_count = sum(
+        feature_hash in new_features for feature_hash in feature_hashes
+    )
+    validated_count = sum(
+        feature_hash in feature_errors or feature_hash in truncated_errors
+        for feature_hash in feature_hashes
+    )
+    sample_weight = new_feature_count / validated_count if validated_count else 1.0
+
+    for index, feature_hash in enumerate(feature_hashes):
+        if feature_hash in known_feature_errors:
+            records, weight = known_feature_errors[feature_hash], 1.0
+            feature_errors[feature_hash] = records
+        elif feature_hash in feature_errors:
+            records, weight = feature_errors[feature_hash], sample_weight
+        elif feature_hash in truncated_errors:
+            records, weight = truncated_errors[feature_hash], sample_weight
+        else:
+            continue
+
+        result["errors"].extend(
+            (
+                {
+                    "message": record["message"],
+                    "path": ["features", index, *record["path"]],
+                },
+                weight,
+            )
+            for record in records
+        )
+
+    return result
+
+
+def validate_many(
+    payloads: Iterable[Any], version: str
+) -> Iterator[list[ValidationError]]:
+    """Schema errors for each of many payloads of the same version, reusing one validator."""
+
+    validator = get_version_validator(version)
+
+    for data in payloads:
+        if is_valid_fast(data, version):
+            yield []
+        else:
+            yield sorted(validator.iter_errors(data), key=str)
 
 
 def get_schema_errors(
-    data: Any, schema: Mapping[str, Any] | bool
+    data: Any, schema: Mapping[str, Any] | bool, max_errors: Optional[int] = None
 ) -> list[ValidationError]:
-    """If feed data fails to validate against JSON schema (with schema version)"""
+    """If feed data fails to validate against JSON schema (with schema version). Stops after ``max_errors`` errors, if given."""
 
     v = Draft7Validator(schema, registry=REGISTRY)
 
-    return sorted(v.iter_errors(data), key=str)
+    return sorted(islice(v.iter_errors(data), max_errors), key=str)
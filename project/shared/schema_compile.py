@@ -0,0 +1,172 @@
+import copy
+import importlib
+import random
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib.parse import urldefrag, urljoin
+
+import fastjsonschema
+
+COMPILED_FOLDER = Path(__file__).parent / "compiled"
+COMPILED_PACKAGE = f"{__package__}.compiled"
+
+# Match jsonschema's defaults: formats aren't asserted, and data is never modified
+COMPILE_OPTIONS = {
+    "use_default": False,
+    "use_formats": False,
+}
+
+
+def no_retrieval(uri: str):
+    raise fastjsonschema.JsonSchemaDefinitionException(f"Schema {uri} is not bundled")
+
+
+def bundle_schema(schema: dict[str, Any], base_uri: str = "") -> dict[str, Any]:
+    """
+    Returns a copy of a schema where every ``$ref`` points into the schema itself (eg. ``#/properties/features/...``) and embedded ``$id`` s are removed.
+
+    fastjsonschema can't resolve refs relative to embedded ``$id`` s, which the bundled WZDx schemas use for every sub-schema (RoadEventFeature.json, FeedInfo.json, etc.).
+    """
+
+    # Location of every embedded schema (by its absolute URI), as a JSON pointer from the root
+    locations: dict[str, str] = {}
+
+    def find_ids(node: Any, base: str, pointer: str):
+        if isinstance(node, dict):
+            if isinstance(node.get("$id"), str):
+                base = urldefrag(urljoin(base, node["$id"]))[0]
+                locations.setdefault(base, pointer)
+            for key, value in node.items():
+                find_ids(value, base, f"{pointer}/{escape_pointer(key)}")
+        elif isinstance(node, list):
+            for index, value in enumerate(node):
+                find_ids(value, base, f"{pointer}/{index}")
+
+    def rewrite(node: Any, base: str) -> Any:
+        if isinstance(node, dict):
+            if isinstance(node.get("$id"), str):
+                base = urldefrag(urljoin(base, node["$id"]))[0]
+
+            bundled = {}
+            for key, value in node.items():
+                if key == "$id":
+                    continue
+                if key == "$ref" and isinstance(value, str):
+                    uri, fragment = urldefrag(urljoin(base, value))
+                    if uri not in locations:
+                        raise fastjsonschema.JsonSchemaDefinitionException(
+                            f"Schema {uri} is not bundled"
+                        )
+                    bundled[key] = f"#{locations[uri]}{fragment}"
+                else:
+                    bundled[key] = rewrite(value, base)
+            return bundled
+        if isinstance(node, list):
+            return [rewrite(value, base) for value in node]
+        return node
+
+    root_base = urldefrag(urljoin(base_uri, schema.get("$id", "")))[0]
+    locations[root_base] = ""
+    find_ids(schema, root_base, "")
+
+    return rewrite(schema, root_base)
+
+
+def escape_pointer(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def bundle_subschema(
+    schema: dict[str, Any], base_uri: str = "", pointer: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Bundles a schema, and if ``pointer`` is given (eg. ``#/properties/features/items``), validates against that subschema instead of the root. Definitions stay reachable, since a sibling ``$ref`` overrides every other keyword in draft 7.
+    """
+
+    bundled = bundle_schema(schema, base_uri)
+    if pointer is not None:
+        bundled["$ref"] = pointer
+
+    return bundled
+
+
+def compile_schema_to_code(
+    schema: dict[str, Any], base_uri: str = "", pointer: Optional[str] = None
+) -> str:
+    """Generates the source of a Python module with a ``validate`` function specialized for the schema."""
+    return fastjsonschema.compile_to_code(
+        bundle_subschema(schema, base_uri, pointer),
+        handlers={"http": no_retrieval, "https": no_retrieval},
+        **COMPILE_OPTIONS,
+    )
+
+
+def compile_schema(
+    schema: dict[str, Any], base_uri: str = "", pointer: Optional[str] = None
+) -> Callable[[Any], Any]:
+    """Same as :func:`compile_schema_to_code`, but returns the ``validate`` function directly."""
+    return fastjsonschema.compile(
+        bundle_subschema(schema, base_uri, pointer),
+        handlers={"http": no_retrieval, "https": no_retrieval},
+        **COMPILE_OPTIONS,
+    )
+
+
+def load_compiled_validator(module_name: str) -> Optional[Callable[[Any], Any]]:
+    """Returns the ``validate`` function of a module written by ``manage.py compileschemas``, if it exists."""
+    try:
+        module = importlib.import_module(f"{COMPILED_PACKAGE}.{module_name}")
+    except ImportError:
+        return None
+
+    return module.validate
+
+
+# DIFFERENTIAL CHECKS
+# Mutations used to generate feeds from known ones, to compare the generated validators against Draft7Validator
+
+MUTATION_VALUES = [None, "", "not-a-valid-value", -1, 0, 1.5, True, [], {}]
+
+
+def mutate(data: Any, rng: random.Random, mutations: int = 3) -> Any:
+    """Returns a copy of data with a few random values removed, replaced, or added."""
+
+    mutated = copy.deepcopy(data)
+
+    for _ in range(mutations):
+        # Pick a random container in the document
+        containers = []
+        stack = [mutated]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                containers.append(node)
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                containers.append(node)
+                stack.extend(node)
+
+        if not containers:
+            return rng.choice(MUTATION_VALUES)
+
+        container = rng.choice(containers)
+        if len(container) == 0:
+            continue
+
+        if isinstance(container, dict):
+            key = rng.choice(list(container.keys()))
+            action = rng.choice(["remove", "replace", "add"])
+            if action == "remove":
+                del container[key]
+            elif action == "replace":
+                container[key] = rng.choice(MUTATION_VALUES)
+            else:
+                container[f"{key}_extra"] = rng.choice(MUTATION_VALUES)
+        else:
+            index = rng.randrange(len(container))
+            if rng.random() < 0.5:
+                container.pop(index)
+            else:
+                container[index] = rng.choice(MUTATION_VALUES)
+
+    return mutated
@@ -13,5 +13,7 @@ cd $BASE_DIR/project || exit | exit
 $PYTHON_COMMAND manage.py makemigrations
 $PYTHON_COMMAND manage.py migrate
 $PYTHON_COMMAND manage.py collectstatic --noinput --clear
+$PYTHON_COMMAND manage.py compileschemas
+$PYTHON_COMMAND manage.py refreshevents
 
 systemctl restart gunicorn